@@ -0,0 +1,106 @@
+"""Read and write the binary files of compiled maps and trained models.
+
+The layout of a file is the magic bytes, the length of the header (4 bytes,
+little endian), the JSON header and then the arrays aligned to `ALIGNMENT`
+bytes. The `version` item of the header is the version of the format, and its
+`arrays` item stores the dtype, shape and offset (from the end of header) of
+each array.
+"""
+
+import json
+import pathlib
+import struct
+
+import numpy as np
+
+ALIGNMENT = 64
+
+
+def write_file(path, magic, header, arrays):
+    """Write a binary file. The file is written to a temporary file first so
+    that a reader never sees a partial one.
+
+    Args:
+        path (str): The path of the file.
+        magic (bytes): The magic bytes of the kind of file.
+        header (dict): The JSON serializable items of the header. The
+            `arrays` item is filled in.
+        arrays (dict): The numpy arrays keyed by their names.
+    """
+
+    header = dict(header, arrays={})
+    # the offsets are relative to the end of header
+    offset = 0
+    for name, array in arrays.items():
+        header['arrays'][name] = {'dtype': array.dtype.str,
+                                  'shape': list(array.shape),
+                                  'offset': offset}
+        offset = _align(offset + array.nbytes)
+    header_bytes = json.dumps(header).encode()
+    data_start = _align(len(magic) + 4 + len(header_bytes))
+
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    with tmp.open('wb') as binfile:
+        binfile.write(magic + struct.pack('<I', len(header_bytes))
+                      + header_bytes)
+        for name, array in arrays.items():
+            binfile.seek(data_start + header['arrays'][name]['offset'])
+            binfile.write(np.ascontiguousarray(array).tobytes())
+        binfile.truncate(data_start + offset)
+    tmp.replace(path)
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def read_header(path, magic, version):
+    """Read the header of a binary file.
+
+    Returns:
+        tuple: (header, the offset where the arrays start), or None if the file
+            is not a file of the magic bytes and version.
+    """
+
+    try:
+        with pathlib.Path(path).open('rb') as binfile:
+            if binfile.read(len(magic)) != magic:
+                return None
+            length, = struct.unpack('<I', binfile.read(4))
+            header = json.loads(binfile.read(length).decode())
+    except (OSError, ValueError, struct.error):
+        return None
+    if header.get('version') != version:
+        return None
+    return header, _align(len(magic) + 4 + length)
+
+
+def load_arrays(path, header, data_start, mmap_mode='r'):
+    """Load every array of a binary file.
+
+    Args:
+        path (str): The path of the file.
+        header (dict): The header returned by `read_header`.
+        data_start (int): The offset returned by `read_header`.
+        mmap_mode (str, optional): Defaults to 'r'. The mode of the memory
+            map, or read the arrays into memory if None.
+
+    Returns:
+        dict: The arrays keyed by their names.
+    """
+
+    # map (or read) the file once and view every array in it
+    if mmap_mode is None:
+        buffer = np.fromfile(path, dtype=np.uint8, offset=data_start)
+    else:
+        buffer = np.memmap(path, dtype=np.uint8, mode=mmap_mode,
+                           offset=data_start)
+    arrays = dict()
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        nbytes = int(np.prod(spec['shape'])) * dtype.itemsize
+        arrays[name] = buffer[spec['offset']:spec['offset'] + nbytes].view(
+            dtype).reshape(spec['shape'])
+    return arrays
@@ -0,0 +1,21 @@
+"""Define the `Callback` class which reports progress without Qt."""
+
+
+class Callback(object):
+    def __init__(self):
+        """A list of plain callables which are called with the same arguments
+        whenever the callback is emitted. The interface mimics the one of Qt
+        signals, so a Qt signal's `emit` can be connected directly.
+        """
+
+        self.__funcs = list()
+
+    def connect(self, func):
+        self.__funcs.append(func)
+
+    def disconnect(self, func):
+        self.__funcs.remove(func)
+
+    def emit(self, *args):
+        for func in self.__funcs:
+            func(*args)
@@ -4,13 +4,19 @@ import math
 
 import numpy as np
 
-from .planecoord import Line2D, LineSeg2D
+from .planecoord import LineSegArray2D
+from .spatial import UniformGrid
 
 np.set_printoptions(suppress=True)
 
 
 class Car(object):
-    def __init__(self, pos, angle, radius, wall_points):
+    # the # of walls from which a spatial index is built for the map
+    index_threshold = 64
+
+    def __init__(self, pos, angle, radius, wall_points,
+                 radar_angles=(0, 45, -45), wall_index=None,
+                 sensor_field=None):
         """The car controlled by fuzzy system.
 
         Args:
@@ -18,17 +24,32 @@ class Car(object):
             angle (float): the angle of the car in degree and always in
                 [0, 360).
             radius (int): the size (radius) of the car.
-            wall_points (list): a list with all the edge points of the map.
+            wall_points (list or LineSegArray2D): a list with all the edge
+                points of the map, or the walls built from them.
+            radar_angles (tuple, optional): Defaults to (0, 45, -45). The
+                offsets in degree of the front, left and right radars from the
+                angle of the car.
+            wall_index (UniformGrid, optional): Defaults to None. The spatial
+                index built for the same map. If None, a new one is built when
+                the map has at least `index_threshold` walls.
+            sensor_field (SensorField, optional): Defaults to None. The
+                precomputed field of the same map. If given, the radars and
+                collision checks are looked up from it instead of the walls.
         """
 
         self.pos = list(pos)
         self.angle = angle % 360
         self.radius = radius
         self.wheel_angle = 0
-        self.walls = []
-        for idx in range(len(wall_points) - 1):
-            self.walls.append(
-                LineSeg2D(wall_points[idx], wall_points[idx + 1]))
+        self.radar_angles = np.radians(radar_angles)
+        if isinstance(wall_points, LineSegArray2D):
+            self.wall_array = wall_points
+        else:
+            self.wall_array = LineSegArray2D(wall_points)
+        if wall_index is None and len(self.wall_array) >= self.index_threshold:
+            wall_index = UniformGrid(self.wall_array)
+        self.wall_index = wall_index
+        self.sensor_field = sensor_field
 
     def move(self, wheel_angle):
         """Make the car move to mext position according to the current wheel
@@ -51,40 +72,28 @@ class Car(object):
             self.angle - math.degrees(math.asin(
                 math.sin(wheel_angle) / self.radius))) % 360
 
-    def dist(self, direction):
-        """Get the distance between car and any closest wall.
-
-        Args:
-            direction (string): Can take 'front', 'left' and 'right', determine
-                which distance of radar.
+    def sense(self):
+        """Cast every radar against every wall at once.
 
         Returns:
-            tuple: (intersection, distance).
+            tuple: (intersections, distances) where intersections is a K x 2
+                array and distances is an array of length K in the order of
+                `radar_angles`. The radars detecting nothing get NaN
+                intersections and infinite distances.
         """
 
-        if direction == 'front':
-            degree = self.angle % 360
-        elif direction == 'left':
-            degree = (self.angle + 45) % 360
-        else:
-            degree = (self.angle - 45) % 360
-
-        radar = Line2D(self.pos, (self.pos[0] + math.cos(math.radians(degree)),
-                                  self.pos[1] + math.sin(math.radians(degree))))
-        intersections = []
-        for wall in self.walls:
-            inter = wall.intersection(radar)
-            if inter is not None:
-                if (0 < degree < 180 and inter[1] > self.pos[1]
-                        or 180 < degree < 360 and inter[1] < self.pos[1]
-                        or (90 > degree >= 0 or 360 > degree > 270) and inter[0] > self.pos[0]
-                        or 90 < degree < 270 and inter[0] < self.pos[0]):
-                    intersections.append(inter)
-
-        if not intersections:
-            return (None, '--')
-        return (min(intersections, key=lambda item: dist(self.pos, item)),
-                min(dist(self.pos, i) for i in intersections))
+        radians = math.radians(self.angle) + self.radar_angles
+        directions = np.column_stack((np.cos(radians), np.sin(radians)))
+        if self.sensor_field is not None:
+            dists = self.sensor_field.ray_dists(np.array([self.pos]),
+                                                radians[np.newaxis])[0]
+            with np.errstate(invalid='ignore'):
+                intersections = self.pos + dists[:, np.newaxis] * directions
+            intersections[np.isinf(dists)] = np.nan
+            return intersections, dists
+        if self.wall_index is not None:
+            return self.wall_index.ray_intersections(self.pos, directions)
+        return self.wall_array.ray_intersections(self.pos, directions)
 
     @property
     def is_collided(self):
@@ -94,12 +103,10 @@ class Car(object):
             boolean: if the car is collided.
         """
 
-        for wall in self.walls:
-            if wall.point_dist(self.pos) <= self.radius:
-                return True
-        return False
-
-
-def dist(pt0, pt1):
-    """Return the distance between pt0 and pt1."""
-    return math.sqrt(sum(map(lambda a, b: (a - b)**2, pt0, pt1)))
+        if self.sensor_field is not None:
+            return bool(self.sensor_field.is_near(np.array([self.pos]),
+                                                  self.radius)[0])
+        if self.wall_index is None:
+            return self.wall_array.is_near(self.pos, self.radius)
+        return self.wall_array.is_near(
+            self.pos, self.radius, self.wall_index.nearby(self.pos, self.radius))
@@ -0,0 +1,174 @@
+"""Define the `CarBatch` class which simulates many cars in lockstep."""
+
+import numpy as np
+
+from .planecoord import LineSegArray2D
+
+
+class CarBatch(object):
+    def __init__(self, poses, angles, radius, wall_points, ending_area=None,
+                 radar_angles=(0, 45, -45), sensor_field=None):
+        """A batch of cars in the same map whose states are stored as arrays
+        (struct of arrays). Every method works on all cars at once and the
+        cars which have finished (collided or arrived) are masked out.
+
+        Args:
+            poses (numpy.ndarray): The M x 2 positions of the cars.
+            angles (numpy.ndarray): The M angles of the cars in degree.
+            radius (int): the size (radius) of the cars.
+            wall_points (list or LineSegArray2D): a list with all the edge
+                points of the map, or the walls built from them.
+            ending_area (tuple, optional): Defaults to None. The (left-top,
+                right-bottom) corners of the ending area.
+            radar_angles (tuple, optional): Defaults to (0, 45, -45). The
+                offsets in degree of the front, left and right radars from the
+                angle of the car.
+            sensor_field (SensorField, optional): Defaults to None. The
+                precomputed field of the same map. If given, the radars and
+                collision checks are looked up from it instead of the walls.
+        """
+
+        self.pos = np.array(poses, dtype=float).reshape(-1, 2)
+        self.angle = np.broadcast_to(
+            np.asarray(angles, dtype=float) % 360, len(self.pos)).copy()
+        self.radius = radius
+        self.wheel_angle = np.zeros(len(self.pos))
+        self.radar_angles = np.radians(radar_angles)
+        if isinstance(wall_points, LineSegArray2D):
+            self.wall_array = wall_points
+        else:
+            self.wall_array = LineSegArray2D(wall_points)
+        self.ending_area = ending_area
+        self.sensor_field = sensor_field
+
+        self.is_active = np.ones(len(self.pos), dtype=bool)
+        self.is_collided = np.zeros(len(self.pos), dtype=bool)
+        self.is_arrived = np.zeros(len(self.pos), dtype=bool)
+        self.nsteps = np.zeros(len(self.pos), dtype=int)
+
+    def __len__(self):
+        return len(self.pos)
+
+    def move(self, wheel_angles):
+        """Make every active car move to next position according to its wheel
+        angle. The kinematics is the same as the one of `Car.move`.
+
+        Args:
+            wheel_angles (numpy.ndarray): The M wheel angles which should be
+                in [-40, 40]. The ones of inactive cars are ignored.
+        """
+
+        active = self.is_active
+        self.wheel_angle[active] = np.clip(
+            np.broadcast_to(wheel_angles, len(self))[active], -40, 40)
+        wheel_angle = np.radians(self.wheel_angle[active])
+        car_angle = np.radians(self.angle[active])
+        sin_wheel = np.sin(wheel_angle)
+
+        self.pos[active, 0] += (np.cos(car_angle + wheel_angle)
+                                + sin_wheel * np.sin(car_angle))
+        self.pos[active, 1] += (np.sin(car_angle + wheel_angle)
+                                - sin_wheel * np.cos(car_angle))
+        self.angle[active] = (self.angle[active] - np.degrees(
+            np.arcsin(sin_wheel / self.radius))) % 360
+        self.nsteps[active] += 1
+
+    def sense(self, indices=None):
+        """Cast every radar of every car against every wall at once.
+
+        Args:
+            indices (numpy.ndarray, optional): Defaults to None. The indices
+                of the cars to sense. Sense all cars if None.
+
+        Returns:
+            tuple: (intersections, distances) where intersections is a
+                M x K x 2 array and distances is a M x K array in the order of
+                `radar_angles`. The radars detecting nothing get NaN
+                intersections and infinite distances.
+        """
+
+        if indices is None:
+            indices = slice(None)
+        radians = np.radians(self.angle[indices])[:, np.newaxis] + \
+            self.radar_angles
+        directions = np.stack((np.cos(radians), np.sin(radians)), axis=2)
+        if self.sensor_field is not None:
+            pos = self.pos[indices]
+            dists = self.sensor_field.ray_dists(pos, radians)
+            with np.errstate(invalid='ignore'):
+                intersections = (pos[:, np.newaxis]
+                                 + dists[..., np.newaxis] * directions)
+            intersections[np.isinf(dists)] = np.nan
+            return intersections, dists
+        return self.wall_array.batch_ray_intersections(self.pos[indices],
+                                                       directions)
+
+    def update(self):
+        """Check if every active car has collided or arrived at the ending
+        area, and deactivate the finished ones.
+
+        Returns:
+            numpy.ndarray: The M booleans showing if each car is still active.
+        """
+
+        active = np.flatnonzero(self.is_active)
+        if self.ending_area is not None:
+            (left, top), (right, bottom) = self.ending_area
+            pos = self.pos[active]
+            self.is_arrived[active] = ((left <= pos[:, 0]) & (pos[:, 0] <= right)
+                                       & (bottom <= pos[:, 1])
+                                       & (pos[:, 1] <= top))
+        active = active[~self.is_arrived[active]]
+        if self.sensor_field is not None:
+            self.is_collided[active] = self.sensor_field.is_near(
+                self.pos[active], self.radius)
+        else:
+            self.is_collided[active] = self.wall_array.batch_is_near(
+                self.pos[active], self.radius)
+        self.is_active &= ~(self.is_arrived | self.is_collided)
+        return self.is_active
+
+    def step(self, controller):
+        """Run one tick for every active car in the same order as `Drive`:
+        sense, check the finished cars, then move by the controller. The cars
+        whose radars detect nothing (out of the map) are stopped as collided.
+        Only the cars active at the start of the tick are sensed.
+
+        Args:
+            controller (callable): The function taking the A x 2 positions
+                and the A x K radar distances of the A cars still active
+                (in the order of `numpy.flatnonzero(is_active)`) and returning
+                their A wheel angles.
+
+        Returns:
+            tuple: The M x K x 2 intersections and M x K distances sensed in
+                this tick, which are NaN and infinite for the inactive cars.
+        """
+
+        active = np.flatnonzero(self.is_active)
+        intersections = np.full((len(self), len(self.radar_angles), 2), np.nan)
+        dists = np.full((len(self), len(self.radar_angles)), np.inf)
+        intersections[active], dists[active] = self.sense(active)
+        self.update()
+        is_lost = self.is_active & ~np.isfinite(dists).all(axis=1)
+        self.is_collided |= is_lost
+        self.is_active &= ~is_lost
+        active = np.flatnonzero(self.is_active)
+        if len(active) > 0:
+            wheel_angles = np.zeros(len(self))
+            wheel_angles[active] = controller(self.pos[active], dists[active])
+            self.move(wheel_angles)
+        return intersections, dists
+
+    def run(self, controller, max_steps=1000):
+        """Step until every car has finished or `max_steps` ticks passed.
+
+        Returns:
+            numpy.ndarray: The M booleans showing if each car is still active.
+        """
+
+        for _ in range(max_steps):
+            if not self.is_active.any():
+                break
+            self.step(controller)
+        return self.is_active
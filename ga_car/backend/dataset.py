@@ -0,0 +1,173 @@
+"""Read the training datasets."""
+
+import collections
+import hashlib
+import json
+import pathlib
+import shutil
+
+import numpy as np
+
+
+class Dataset(object):
+    # the # of bytes of text parsed at once
+    chunk_bytes = 64 * 2**20
+
+    def __init__(self, path, cache_dir=None):
+        """A training dataset whose rows (inputs followed by the expected
+        output) are stored as a float matrix. The text file is parsed in bulk
+        into a `.npy` cache on first use, along with the per-column
+        statistics, and the cache is memory mapped. The cache is rebuilt only
+        when the modified time or size of the text file changes.
+
+        Args:
+            path (str): The path of the text file.
+            cache_dir (str, optional): Defaults to None. The folder of cache.
+                Use the `.cache` folder next to the text file if None.
+        """
+
+        self.path = pathlib.Path(path)
+        self.name = self.path.stem
+        if cache_dir is None:
+            cache_dir = self.path.parent / '.cache'
+        self.cache_path = pathlib.Path(cache_dir) / (self.name + '.npy')
+        self.stats_path = pathlib.Path(cache_dir) / (self.name + '.json')
+        self.__array = None
+        self.__stats = None
+
+    @property
+    def is_loaded(self):
+        return self.__array is not None
+
+    def load(self):
+        """Memory map the cache, building it first if it is outdated.
+
+        Returns:
+            Dataset: The dataset itself.
+        """
+
+        if self.__array is None:
+            stamp = self.__source_stamp()
+            stats = self.__read_stats()
+            if stats is None or stats['source'] != stamp:
+                stats = self.__build_cache(stamp)
+            self.__array = np.load(self.cache_path, mmap_mode='r')
+            self.__stats = {key: np.array(value)
+                            for key, value in stats.items()
+                            if key in ('min', 'max', 'mean', 'std')}
+            self.__stats['source'] = stamp
+        return self
+
+    def __source_stamp(self):
+        stat = self.path.stat()
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def __read_stats(self):
+        try:
+            with self.stats_path.open() as statsfile:
+                stats = json.load(statsfile)
+        except (OSError, ValueError):
+            return None
+        return stats if self.cache_path.exists() else None
+
+    def __build_cache(self, stamp):
+        """Parse the text file by chunks into a raw file, then prepend the
+        `.npy` header once the # of rows is known."""
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        raw_path = self.cache_path.with_name(self.cache_path.name + '.raw')
+        nrow, ncol = 0, None
+        with self.path.open('rb') as textfile, raw_path.open('wb') as rawfile:
+            while True:
+                lines = textfile.readlines(self.chunk_bytes)
+                if not lines:
+                    break
+                values = np.array(b' '.join(lines).split(), dtype=float)
+                if ncol is None:
+                    ncol = len(lines[0].split())
+                    lower = np.full(ncol, np.inf)
+                    upper = np.full(ncol, -np.inf)
+                    sums = np.zeros(ncol)
+                    sq_sums = np.zeros(ncol)
+                rows = values.reshape(-1, ncol)
+                nrow += len(rows)
+                np.minimum(lower, rows.min(axis=0, initial=np.inf), out=lower)
+                np.maximum(upper, rows.max(axis=0, initial=-np.inf), out=upper)
+                sums += rows.sum(axis=0)
+                sq_sums += (rows ** 2).sum(axis=0)
+                rows.tofile(rawfile)
+        if ncol is None:
+            raise ValueError('The dataset "{}" is empty.'.format(self.path))
+
+        tmp_path = self.cache_path.with_name(self.cache_path.name + '.tmp')
+        with tmp_path.open('wb') as npyfile, raw_path.open('rb') as rawfile:
+            np.lib.format.write_array_header_1_0(npyfile, {
+                'descr': np.dtype(float).str, 'fortran_order': False,
+                'shape': (nrow, ncol)})
+            shutil.copyfileobj(rawfile, npyfile)
+        raw_path.unlink()
+        tmp_path.replace(self.cache_path)
+
+        mean = sums / nrow
+        stats = {'source': stamp, 'min': lower.tolist(),
+                 'max': upper.tolist(), 'mean': mean.tolist(),
+                 'std': np.sqrt(np.maximum(sq_sums / nrow - mean ** 2,
+                                           0)).tolist()}
+        with self.stats_path.open('w') as statsfile:
+            json.dump(stats, statsfile)
+        return stats
+
+    @property
+    def array(self):
+        """numpy.ndarray: The N x (D + 1) memory mapped rows."""
+        return self.load().__array
+
+    @property
+    def inputs(self):
+        """numpy.ndarray: The N x D inputs (a view of `array`)."""
+        return self.array[:, :-1]
+
+    @property
+    def outputs(self):
+        """numpy.ndarray: The N expected outputs (a view of `array`)."""
+        return self.array[:, -1]
+
+    @property
+    def stats(self):
+        """dict: The `min`, `max`, `mean` and `std` of each column, and the
+        `source` stamp of the text file."""
+        return self.load().__stats
+
+    @property
+    def data_dim(self):
+        return self.array.shape[1] - 1
+
+    @property
+    def mean_range(self):
+        """tuple: The minimum and maximum of all inputs."""
+        return (float(self.stats['min'][:-1].min()),
+                float(self.stats['max'][:-1].max()))
+
+    @property
+    def digest(self):
+        """bytes: The ID of the dataset from its path and source stamp."""
+        return hashlib.blake2b(
+            json.dumps([str(self.path.resolve()),
+                        self.stats['source']]).encode(),
+            digest_size=16).digest()
+
+    def __len__(self):
+        return len(self.array)
+
+
+def load_datasets(folderpath='data', cache_dir=None):
+    """Get every training dataset in `folderpath` folder without loading them.
+    Each dataset is loaded when its arrays are used first.
+
+    Returns:
+        collections.OrderedDict: The `Dataset`s keyed by their names.
+    """
+
+    folderpath = pathlib.Path(folderpath)
+    return collections.OrderedDict(sorted(
+        (filepath.stem, Dataset(filepath, cache_dir))
+        for filepath in folderpath.glob("*.txt")))
@@ -0,0 +1,142 @@
+"""Define the `Drive` class which drives a car by a RBFN without Qt."""
+
+import math
+import time
+
+import numpy as np
+
+from .callback import Callback
+from .trajectory import Trajectory
+
+
+class Drive(object):
+    def __init__(self, car, rbfn, ending_area=None, fps=None,
+                 frame_interval=0.05, max_steps=10000):
+        """Drive the car by the RBFN until it arrives at the ending area,
+        collides, or `max_steps` steps passed.
+
+        The drive runs as fast as possible unless `fps` is given. The frames
+        are reported by `on_frame` at most once every `frame_interval`
+        seconds (plus the last one), so a renderer samples the trajectory at
+        its own rate without slowing down the drive.
+
+        Args:
+            car (Car): The car to drive.
+            rbfn (RBFN): The trained RBFN which outputs the wheel angle.
+            ending_area (tuple, optional): Defaults to None. The (left-top,
+                right-bottom) corners of the ending area.
+            fps (float, optional): Defaults to None. The # of steps per second
+                in real-time mode. Run at max speed if None.
+            frame_interval (float, optional): Defaults to 0.05. The minimum
+                time in second between two reported frames.
+            max_steps (int, optional): Defaults to 10000. The upper bound of
+                the # of steps.
+        """
+
+        self.abort = False
+        self.on_console = Callback()
+        self.on_frame = Callback()
+        self.on_collided = Callback()
+        self.car = car
+        self.rbfn = rbfn
+        self.ending_area = ending_area
+        self.fps = fps
+        self.frame_interval = frame_interval
+        self.max_steps = max_steps
+        # one of 'arrived', 'collided', 'lost', 'aborted' and 'timeout'
+        self.status = None
+        self.elapsed = 0
+
+    def run(self):
+        """Drive the car and return the trajectory.
+
+        Returns:
+            Trajectory: The position, heading, wheel angle and radar distances
+                of each step.
+        """
+
+        start = time.perf_counter()
+        trajectory = Trajectory()
+        last_frame_time = -math.inf
+        intersections = dists = None
+        is_shown = False
+        self.status = None
+        for _ in range(self.max_steps):
+            if self.abort:
+                self.status = 'aborted'
+                break
+            if self.fps:
+                time.sleep(1 / self.fps)
+            intersections, dists = self.car.sense()
+            is_shown = False
+
+            now = time.perf_counter()
+            if now - last_frame_time >= self.frame_interval:
+                last_frame_time = now
+                is_shown = True
+                self.__emit_frame(intersections, dists)
+
+            self.status = self.__check(dists)
+            if self.status is not None:
+                break
+
+            next_wheel_angle = self.__wheel_angle(dists)
+            trajectory.append(self.car.pos, self.car.angle,
+                              next_wheel_angle, dists)
+            self.car.move(next_wheel_angle)
+            intersections = None
+        else:
+            self.status = 'timeout'
+            self.on_console.emit("Note: Car has not arrived after {} steps."
+                                 .format(self.max_steps))
+
+        # always report the frame of the final position
+        if intersections is None:
+            intersections, dists = self.car.sense()
+            is_shown = False
+        if not is_shown:
+            self.__emit_frame(intersections, dists)
+        if self.status == 'collided':
+            self.on_collided.emit()
+        self.elapsed = time.perf_counter() - start
+        self.on_console.emit("Drove {} steps in {:.2f} ms.".format(
+            len(trajectory), self.elapsed * 1000))
+        if self.car.wall_index is not None:
+            self.on_console.emit(self.car.wall_index.report())
+        return trajectory
+
+    def __check(self, dists):
+        if self.ending_area is not None:
+            (left, top), (right, bottom) = self.ending_area
+            if (left <= self.car.pos[0] <= right
+                    and top >= self.car.pos[1] >= bottom):
+                self.on_console.emit("Note: Car has arrived at the ending "
+                                     "area.")
+                return 'arrived'
+
+        if self.car.is_collided:
+            self.on_console.emit("Note: Car has collided.")
+            return 'collided'
+
+        if not np.isfinite(dists).all():
+            self.on_console.emit("Error: Cannot input the fuzzy system since "
+                                 "the distance type error.")
+            return 'lost'
+        return None
+
+    def __wheel_angle(self, dists):
+        if len(self.rbfn.neurons[1].mean) == 3:
+            return self.rbfn.output((dists[0], dists[2], dists[1]),
+                                    antinorm=True)
+        if len(self.rbfn.neurons[1].mean) == 5:
+            return self.rbfn.output((*self.car.pos, dists[0], dists[2],
+                                     dists[1]), antinorm=True)
+        raise ValueError('The length of input is not match to the one of '
+                         'trained RBFN.')
+
+    def __emit_frame(self, intersections, dists):
+        self.on_frame.emit(list(self.car.pos), self.car.angle,
+                           self.car.wheel_angle, intersections, dists)
+
+    def stop(self):
+        self.abort = True
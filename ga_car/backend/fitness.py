@@ -0,0 +1,461 @@
+"""Evaluate the error function for a whole population at once."""
+
+import collections
+import hashlib
+import multiprocessing as mp
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from .rbfn import RBFN, decode_params
+
+# the default upper bound (in bytes) of the temporary tensors
+DEFAULT_MEMORY_BUDGET = 256 * 2**20
+# the default # of rows of dataset streamed at once
+DEFAULT_BLOCK_SIZE = 2**12
+
+
+def get_chunk_size(nsample, nneuron, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """Get the # of chromosomes which can be evaluated together while keeping
+    the temporary P x N x K tensors inside the memory budget.
+
+    Args:
+        nsample (int): The # of data in dataset (N).
+        nneuron (int): The # of neurons including the threshold one.
+        memory_budget (int, optional): Defaults to DEFAULT_MEMORY_BUDGET. The
+            maximum bytes of the temporary tensors.
+
+    Returns:
+        int: The chunk size which is at least 1.
+    """
+
+    # two float64 tensors of P x N x K are alive at the same time
+    bytes_per_chromosome = 2 * 8 * max(nsample, 1) * max(nneuron - 1, 1)
+    return max(1, int(memory_budget // bytes_per_chromosome))
+
+
+def population_err_func(population, inputs, outputs, nneuron,
+                        memory_budget=DEFAULT_MEMORY_BUDGET,
+                        block_size=DEFAULT_BLOCK_SIZE):
+    """Calculate the error function for every chromosome in the population
+    by broadcasting the population against the dataset. The dataset is
+    streamed by blocks of `block_size` rows and the absolute errors are summed
+    block by block, so the peak memory depends on the block size rather than
+    the length of dataset, and the inputs may be memory mapped. This function
+    is specially designed to be pickable for multiprocessing.
+
+    Args:
+        population (numpy.ndarray): The P x L matrix whose rows are chromosomes.
+        inputs (numpy.ndarray): The N x D inputs of the training dataset.
+        outputs (numpy.ndarray): The N expected outputs of the training
+            dataset.
+        nneuron (int): The # of neurons including the threshold one.
+        memory_budget (int, optional): Defaults to DEFAULT_MEMORY_BUDGET. The
+            maximum bytes of the temporary tensors.
+        block_size (int, optional): Defaults to DEFAULT_BLOCK_SIZE. The # of
+            rows of dataset read at once.
+
+    Returns:
+        numpy.ndarray: The P results of fitting function.
+    """
+
+    population = np.asarray(population, dtype=float)
+    nsample = len(inputs)
+    block_size = max(1, min(block_size, nsample))
+    chunk_size = get_chunk_size(block_size, nneuron, memory_budget)
+    thresholds, weights, means, sds = decode_params(population, nneuron)
+    valid = sds > 0
+    weights = np.where(valid, weights, 0)
+    coefs = np.where(valid, -0.5 / np.where(valid, sds, 1) ** 2, 0)
+    mean_sq = (means ** 2).sum(axis=2)
+
+    sums = np.zeros(len(population))
+    for row_start in range(0, nsample, block_size):
+        # only one block of dataset is in memory at a time
+        block_inputs = np.asarray(
+            inputs[row_start:row_start + block_size], dtype=float)
+        block_outputs = np.asarray(
+            outputs[row_start:row_start + block_size], dtype=float)
+        input_sq = (block_inputs ** 2).sum(axis=1)
+        for start in range(0, len(population), chunk_size):
+            stop = start + chunk_size
+
+            # squared distances between every input and every mean (P x N x K)
+            sq_dists = np.matmul(block_inputs,
+                                 means[start:stop].transpose(0, 2, 1))
+            sq_dists *= -2
+            sq_dists += input_sq[:, np.newaxis]
+            sq_dists += mean_sq[start:stop, np.newaxis, :]
+            np.maximum(sq_dists, 0, out=sq_dists)
+            sq_dists *= coefs[start:stop, np.newaxis, :]
+            np.exp(sq_dists, out=sq_dists)
+
+            res = np.matmul(sq_dists,
+                            weights[start:stop, :, np.newaxis])[..., 0]
+            res += thresholds[start:stop, np.newaxis]
+            res = RBFN.antinormalize(res)
+            res -= block_outputs
+            sums[start:stop] += np.abs(res).sum(axis=1)
+    return sums / max(nsample, 1)
+
+
+class Evaluator(object):
+    def __init__(self, rbfn, inputs, outputs,
+                 memory_budget=DEFAULT_MEMORY_BUDGET,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        """Evaluate the error function of populations in current process.
+
+        Args:
+            rbfn (RBFN): The model template which decides the # of neurons.
+            inputs (numpy.ndarray): The N x D inputs of the training dataset.
+            outputs (numpy.ndarray): The N expected outputs of the training
+                dataset.
+            memory_budget (int, optional): Defaults to DEFAULT_MEMORY_BUDGET.
+                The maximum bytes of the temporary tensors.
+            block_size (int, optional): Defaults to DEFAULT_BLOCK_SIZE. The #
+                of rows of dataset streamed at once.
+        """
+
+        self.nneuron = len(rbfn.neurons)
+        self.inputs = inputs
+        self.outputs = outputs
+        self.memory_budget = memory_budget
+        self.block_size = block_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def evaluate(self, population, indices=None):
+        """Get the results of fitting function of the population.
+
+        Args:
+            population (numpy.ndarray): The P x L matrix whose rows are
+                chromosomes.
+            indices (numpy.ndarray, optional): Defaults to None. The indices
+                of the rows of dataset (a mini-batch) to be evaluated on. Use
+                the whole dataset if None.
+
+        Returns:
+            numpy.ndarray: The P results of fitting function.
+        """
+
+        return population_err_func(population,
+                                   *_take_rows(self.inputs, self.outputs,
+                                               indices),
+                                   self.nneuron, self.memory_budget,
+                                   self.block_size)
+
+    def close(self):
+        """Release the resources held by the evaluator."""
+
+
+class PoolEvaluator(Evaluator):
+    def __init__(self, rbfn, inputs, outputs,
+                 memory_budget=DEFAULT_MEMORY_BUDGET,
+                 block_size=DEFAULT_BLOCK_SIZE, processes=None, source=None):
+        """Evaluate the error function of populations with a long-lived pool
+        of worker processes. The dataset and the model template are installed
+        in every worker once while the pool starts, so only the chromosomes
+        are sent to workers in each evaluation.
+
+        Args:
+            processes (int, optional): Defaults to None. The # of worker
+                processes. Use the # of CPUs if None.
+            source (str, optional): Defaults to None. The path of the `.npy`
+                file of the N x (D + 1) dataset (inputs followed by outputs)
+                which `inputs` and `outputs` are read from. If it is given,
+                every worker memory maps the file by itself instead of
+                receiving a copy of the dataset.
+
+            Other arguments are the same as the ones of `Evaluator`.
+        """
+
+        super().__init__(rbfn, inputs, outputs, memory_budget, block_size)
+        self.processes = processes or mp.cpu_count()
+        if source is None:
+            data = (inputs, outputs)
+        else:
+            data = str(source)
+        self.__pool = mp.Pool(self.processes, initializer=_init_worker,
+                              initargs=(self.nneuron, data,
+                                        memory_budget // self.processes,
+                                        block_size))
+
+    def evaluate(self, population, indices=None):
+        if self.__pool is None:
+            raise RuntimeError('The evaluator has been closed.')
+        # only the indices of mini-batch are sent and the workers take the
+        # rows from their own datasets
+        results = self.__pool.map(
+            _evaluate_in_worker,
+            [(chromosomes, indices)
+             for chromosomes in np.array_split(population, self.processes)])
+        return np.concatenate(results)
+
+    def close(self):
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+            self.__pool = None
+
+
+class SharedMemoryEvaluator(Evaluator):
+    def __init__(self, rbfn, inputs, outputs,
+                 memory_budget=DEFAULT_MEMORY_BUDGET,
+                 block_size=DEFAULT_BLOCK_SIZE, processes=None, capacity=1,
+                 source=None):
+        """Evaluate the error function of populations with a long-lived pool
+        of worker processes where the dataset, the population and the results
+        live in shared memory blocks. Workers read and write their slices of
+        the blocks in place, so only slice indices are sent to workers in each
+        evaluation.
+
+        The population and results blocks hold `capacity` rows, and a smaller
+        population uses their leading rows. They are reallocated only when a
+        larger population comes, so the blocks are not recreated while the #
+        of evaluated chromosomes varies between generations.
+
+        Args:
+            processes (int, optional): Defaults to None. The # of worker
+                processes. Use the # of CPUs if None.
+            capacity (int, optional): Defaults to 1. The # of rows allocated
+                for the population and results at first, e.g. the population
+                size.
+            source (str, optional): Defaults to None. The path of the `.npy`
+                file of the dataset as the one of `PoolEvaluator`. If it is
+                given, the dataset is not copied into shared memory but every
+                worker memory maps the file, whose pages are shared between
+                processes already.
+
+            Other arguments are the same as the ones of `Evaluator`.
+        """
+
+        super().__init__(rbfn, inputs, outputs, memory_budget, block_size)
+        self.processes = processes or mp.cpu_count()
+        if source is None:
+            dataset = np.column_stack((inputs, outputs)).astype(float)
+            self.__dataset_shm, shared_dataset = _create_shared_array(
+                dataset.shape)
+            shared_dataset[:] = dataset
+            data = (self.__dataset_shm.name, dataset.shape)
+        else:
+            self.__dataset_shm = None
+            data = str(source)
+        self.capacity = max(capacity, 1)
+        self.__population_shm = self.__population = None
+        self.__results_shm = self.__results = None
+        # start the resource tracker before the workers are forked, or each
+        # of them starts its own one which treats the attached blocks as
+        # leaked when the worker exits (the tracker only exists on POSIX)
+        if os.name == 'posix':
+            resource_tracker.ensure_running()
+        self.__pool = mp.Pool(self.processes, initializer=_init_shared_worker,
+                              initargs=(self.nneuron, data,
+                                        memory_budget // self.processes,
+                                        block_size))
+
+    def evaluate(self, population, indices=None):
+        if self.__pool is None:
+            raise RuntimeError('The evaluator has been closed.')
+        population = np.asarray(population, dtype=float)
+        nrow = len(population)
+        if (self.__population is None or nrow > len(self.__population)
+                or self.__population.shape[1:] != population.shape[1:]):
+            self.capacity = max(self.capacity, nrow)
+            self.__allocate_population((self.capacity,) + population.shape[1:])
+        self.__population[:nrow] = population
+
+        bounds = np.linspace(0, nrow, self.processes + 1, dtype=int)
+        self.__pool.map(_evaluate_shared_slice,
+                        [(self.__population_shm.name, self.__population.shape,
+                          self.__results_shm.name, start, stop, indices)
+                         for start, stop in zip(bounds[:-1], bounds[1:])
+                         if start < stop])
+        return self.__results[:nrow].copy()
+
+    def close(self):
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+            self.__pool = None
+            self.__release_population()
+            if self.__dataset_shm is not None:
+                self.__dataset_shm.close()
+                self.__dataset_shm.unlink()
+
+    def __allocate_population(self, shape):
+        self.__release_population()
+        self.__population_shm, self.__population = _create_shared_array(shape)
+        self.__results_shm, self.__results = _create_shared_array(shape[:1])
+
+    def __release_population(self):
+        for shm in (self.__population_shm, self.__results_shm):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self.__population_shm = self.__population = None
+        self.__results_shm = self.__results = None
+
+
+def _take_rows(inputs, outputs, indices):
+    if indices is None:
+        return inputs, outputs
+    return inputs[indices], outputs[indices]
+
+
+def _create_shared_array(shape):
+    size = max(int(np.prod(shape)), 1) * np.dtype(float).itemsize
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    return shm, np.ndarray(shape, dtype=float, buffer=shm.buf)
+
+
+class FitnessCache(object):
+    def __init__(self, maxsize, dataset_id):
+        """A bounded LRU cache of the results of fitting function keyed by the
+        hash of chromosome bytes and the dataset ID.
+
+        Args:
+            maxsize (int): The maximum # of cached results.
+            dataset_id (bytes): The ID of the dataset the results belong to.
+        """
+
+        self.maxsize = maxsize
+        self.dataset_id = dataset_id
+        self.hits = 0
+        self.misses = 0
+        self.__entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def key(self, chromosome):
+        digest = hashlib.blake2b(
+            np.ascontiguousarray(chromosome).tobytes(), digest_size=16)
+        return self.dataset_id, digest.digest()
+
+    def evaluate(self, population, evaluate):
+        """Get the results of fitting function of the population where only
+        the chromosomes missing in the cache are evaluated. The identical
+        chromosomes in the population are evaluated only once.
+
+        Args:
+            population (numpy.ndarray): The P x L matrix whose rows are
+                chromosomes.
+            evaluate (callable): The function evaluating a population matrix.
+
+        Returns:
+            numpy.ndarray: The P results of fitting function.
+        """
+
+        results = np.empty(len(population))
+        pending = collections.OrderedDict()
+        for idx, chromosome in enumerate(population):
+            key = self.key(chromosome)
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                results[idx] = self.__entries[key]
+            else:
+                pending.setdefault(key, []).append(idx)
+
+        if pending:
+            firsts = [indices[0] for indices in pending.values()]
+            for (key, indices), res in zip(pending.items(),
+                                           evaluate(population[firsts])):
+                results[indices] = res
+                self.__put(key, res)
+        self.misses += len(pending)
+        self.hits += len(population) - len(pending)
+        return results
+
+    def __put(self, key, result):
+        self.__entries[key] = result
+        if len(self.__entries) > self.maxsize:
+            self.__entries.popitem(last=False)
+
+
+def dataset_digest(*arrays):
+    """Get the ID of a dataset from the bytes of its arrays."""
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.digest()
+
+
+# the dataset and model template installed in each worker process
+_worker_state = {}
+
+
+def _init_worker(nneuron, data, memory_budget, block_size):
+    """Install the dataset, which is either (inputs, outputs) or the path of
+    the `.npy` file of dataset to be memory mapped."""
+    if isinstance(data, str):
+        inputs, outputs = _map_dataset(data)
+    else:
+        inputs, outputs = data
+    _worker_state.update(nneuron=nneuron, inputs=inputs, outputs=outputs,
+                         memory_budget=memory_budget, block_size=block_size)
+
+
+def _map_dataset(path):
+    dataset = np.load(path, mmap_mode='r')
+    return dataset[:, :-1], dataset[:, -1]
+
+
+def _evaluate_in_worker(task):
+    population, indices = task
+    return population_err_func(population,
+                               *_take_rows(_worker_state['inputs'],
+                                           _worker_state['outputs'], indices),
+                               _worker_state['nneuron'],
+                               _worker_state['memory_budget'],
+                               _worker_state['block_size'])
+
+
+def _init_shared_worker(nneuron, data, memory_budget, block_size):
+    """Install the dataset, which is either (the name of shared memory block,
+    its shape) or the path of the `.npy` file of dataset to be memory
+    mapped."""
+    dataset_shm = None
+    if isinstance(data, str):
+        inputs, outputs = _map_dataset(data)
+    else:
+        dataset_shm = shared_memory.SharedMemory(name=data[0])
+        dataset = np.ndarray(data[1], dtype=float, buffer=dataset_shm.buf)
+        inputs, outputs = dataset[:, :-1], dataset[:, -1]
+    _worker_state.update(nneuron=nneuron, dataset_shm=dataset_shm,
+                         inputs=inputs, outputs=outputs,
+                         memory_budget=memory_budget, block_size=block_size,
+                         blocks={})
+
+
+def _attach_shared_array(role, name, shape):
+    """Attach to the shared memory block of a role (population or results)
+    once and reuse it in later calls. The previous block of the role is
+    closed when the main process has replaced it."""
+    blocks = _worker_state['blocks']
+    if role in blocks and blocks[role][0].name != name:
+        shm, _ = blocks.pop(role)
+        shm.close()
+    if role not in blocks:
+        shm = shared_memory.SharedMemory(name=name)
+        blocks[role] = (shm, np.ndarray(shape, dtype=float, buffer=shm.buf))
+    return blocks[role][1]
+
+
+def _evaluate_shared_slice(task):
+    (population_name, population_shape, results_name, start, stop,
+     indices) = task
+    population = _attach_shared_array('population', population_name,
+                                      population_shape)
+    results = _attach_shared_array('results', results_name,
+                                   population_shape[:1])
+    results[start:stop] = population_err_func(
+        population[start:stop],
+        *_take_rows(_worker_state['inputs'], _worker_state['outputs'],
+                    indices),
+        _worker_state['nneuron'],
+        _worker_state['memory_budget'], _worker_state['block_size'])
@@ -1,33 +1,37 @@
-import collections
-import copy
-import functools
-import itertools
-import multiprocessing as mp
 import math
-import random
 import time
 
-from PyQt5.QtCore import QThread, pyqtSignal, pyqtSlot
 import numpy as np
 
-from .rbfn import RBFN
+from .callback import Callback
+from .fitness import (DEFAULT_BLOCK_SIZE, DEFAULT_MEMORY_BUDGET, Evaluator,
+                      FitnessCache, PoolEvaluator, SharedMemoryEvaluator)
+from .simulation import (PoolSimulationEvaluator, SimulationEvaluator,
+                         tracks_digest)
 
 
-TrainingData = collections.namedtuple('TrainingData', ['i', 'o'])
-
-
-class GA(QThread):
-    sig_console = pyqtSignal(str)
-    sig_current_iter_time = pyqtSignal(int)
-    sig_current_error = pyqtSignal(float)
-    sig_iter_error = pyqtSignal(float, float)
-    sig_rbfn = pyqtSignal(RBFN)
-
+class GA(object):
     def __init__(self, iter_times, population_size, reproduction_method, pc, pm,
                  mutation_scale, rbfn, dataset, mean_range=None, sd_max=1,
-                 score_amplifier=1, is_multicore=True):
-        super().__init__()
+                 score_amplifier=1, is_multicore=True,
+                 memory_budget=DEFAULT_MEMORY_BUDGET, is_shared_memory=False,
+                 tournament_size=2, progress_interval=0.1, cache_size=4096,
+                 elitism=0, tracks=None, max_steps=1000,
+                 block_size=DEFAULT_BLOCK_SIZE, batch_size=None,
+                 batch_growth=1.05, full_eval_interval=10, seed=None):
+        if batch_size is not None and batch_size < 1:
+            raise ValueError('The mini-batch size must be at least 1 but {} '
+                             'is given.'.format(batch_size))
+        if batch_growth < 1:
+            raise ValueError('The growth rate of mini-batch must be at least '
+                             '1 but {} is given.'.format(batch_growth))
         self.abort = False
+        self.is_running = False
+        self.on_console = Callback()
+        self.on_current_iter_time = Callback()
+        self.on_current_errors = Callback()
+        self.on_iter_error = Callback()
+        self.on_rbfn = Callback()
         self.iter_times = iter_times
         self.population_size = population_size
         self.score_amplifier = score_amplifier
@@ -39,43 +43,127 @@ class GA(QThread):
         self.mean_range = mean_range
         self.sd_max = sd_max
         self.is_multicore = is_multicore
+        self.memory_budget = memory_budget
+        self.block_size = block_size
+        self.is_shared_memory = is_shared_memory
+        self.tournament_size = tournament_size
+        self.progress_interval = progress_interval
+        self.elitism = min(max(elitism, 0), population_size)
+        # score by driving through the tracks instead of the dataset error
+        self.tracks = tracks
+        self.max_steps = max_steps
+        # score on random mini-batches of the dataset whose size grows by
+        # `batch_growth` times each iteration, where the best chromosomes are
+        # scored on the whole dataset every `full_eval_interval` iterations
+        self.batch_size = batch_size if tracks is None else None
+        self.batch_growth = batch_growth
+        self.full_eval_interval = max(full_eval_interval, 1)
+        self.__sampler = np.random.RandomState(seed)
+        self.__batch_sizes = []
+        self.__last_progress_time = -math.inf
 
         if reproduction_method == 'rw':
             self.__reproduction = self.__roulette_wheel_selection
         else:
             self.__reproduction = self.__tournament_selection
 
+        # the memory mapped arrays of the dataset are used directly and
+        # streamed by blocks in evaluation
+        self.inputs = self.dataset.inputs
+        self.outputs = self.dataset.outputs
+        self.__source = self.dataset.cache_path
+        dataset_id = self.dataset.digest
         if self.mean_range is None:
-            self.mean_range = (min(min(d.i) for d in self.dataset),
-                               max(max(d.i) for d in self.dataset))
+            self.mean_range = self.dataset.mean_range
+
+        # skip re-scoring the chromosomes which have been scored
+        if cache_size > 0 and self.tracks is not None:
+            self.cache = FitnessCache(
+                cache_size, tracks_digest(self.tracks, self.max_steps))
+        elif cache_size > 0:
+            self.cache = FitnessCache(cache_size, dataset_id)
+        else:
+            self.cache = None
 
         # initialize population
-        self.data_dim = len(self.dataset[0].i)
+        self.data_dim = self.inputs.shape[1]
         self.nneuron = len(self.rbfn.neurons)
-        self.population = list()
-        for _ in range(self.population_size):
-            self.population.append(self.__create_chromosome())
+        self.population = self.__create_population(self.population_size)
+        # the preallocated buffer of the next generation
+        self.__offspring = np.empty_like(self.population)
+        # the results of fitting function and if each chromosome has been
+        # modified since its last evaluation
+        self.__results = np.empty(self.population_size)
+        self.__is_dirty = np.ones(self.population_size, dtype=bool)
+        self.nevaluated = 0
+        self.nskipped = 0
+
+        # the bounds of every gene of chromosome
+        nmean = (self.nneuron - 1) * self.data_dim
+        self.__lower_bounds = np.concatenate((
+            np.full(self.nneuron, -1.0), np.full(nmean, self.mean_range[0]),
+            np.full(self.nneuron - 1, 0.001)))
+        self.__upper_bounds = np.concatenate((
+            np.full(self.nneuron, 1.0), np.full(nmean, self.mean_range[1]),
+            np.full(self.nneuron - 1, np.inf)))
 
     def run(self):
+        if self.tracks is not None and self.is_multicore:
+            self.__evaluator = PoolSimulationEvaluator(
+                self.rbfn, self.tracks, self.max_steps)
+        elif self.tracks is not None:
+            self.__evaluator = SimulationEvaluator(self.rbfn, self.tracks,
+                                                   self.max_steps)
+        elif self.is_multicore and self.is_shared_memory:
+            # the workers map the file of a cached dataset by themselves
+            # instead of copying it into shared memory
+            self.__evaluator = SharedMemoryEvaluator(
+                self.rbfn, self.inputs, self.outputs, self.memory_budget,
+                self.block_size, capacity=self.population_size,
+                source=self.__source)
+        elif self.is_multicore:
+            self.__evaluator = PoolEvaluator(
+                self.rbfn, self.inputs, self.outputs, self.memory_budget,
+                self.block_size, source=self.__source)
+        else:
+            self.__evaluator = Evaluator(self.rbfn, self.inputs, self.outputs,
+                                         self.memory_budget, self.block_size)
+        self.is_running = True
+        try:
+            with self.__evaluator:
+                self.__evolve()
+        finally:
+            self.is_running = False
+
+    def __evolve(self):
         best_chromosome = (math.inf,)
         for i in range(self.iter_times):
             if self.abort:
                 break
-            self.sig_current_iter_time.emit(i)
+            self.on_current_iter_time.emit(i)
 
             # calculate the fitting function
-            results = self.__get_err_function_results()
-            best_chromosome = min(best_chromosome, *zip(
-                results, self.population), key=lambda s: s[0])
+            batch_size = self.__get_batch_size(i)
+            if batch_size is None:
+                results = self.__get_err_function_results()
+                best_chromosome = self.__update_best(best_chromosome, results)
+            else:
+                results = self.__get_batch_results(batch_size)
+                if i % self.full_eval_interval == 0:
+                    best_chromosome = self.__rescore_best(best_chromosome,
+                                                          results)
 
             self.__show_results(results, best_chromosome[0])
 
             # reproduction
-            avg_error = sum(results) / len(results)
-            scores = np.full_like(results, max(results) + avg_error) - results
+            avg_error = results.mean()
+            scores = results.max() + avg_error - results
             # amplify the winner
             scores = np.power(scores, self.score_amplifier)
-            self.__reproduction(dict(zip(scores, self.population)))
+            self.__select(np.concatenate((
+                np.argsort(results, kind='stable')[:self.elitism],
+                self.__reproduction(scores,
+                                    self.population_size - self.elitism))))
 
             # crossover
             self.__crossover()
@@ -83,137 +171,196 @@ class GA(QThread):
             # mutation
             self.__mutation()
 
-        self.sig_console.emit('Selecting the best chromosome...')
+        self.on_console.emit('Selecting the best chromosome...')
         results = self.__get_err_function_results()
-        best_chromosome = min(best_chromosome, *zip(
-            results, self.population), key=lambda s: s[0])
-        self.__show_results(results, best_chromosome[0])
-        self.sig_console.emit('The least error: %f' % best_chromosome[0])
-        self.sig_console.emit(
+        best_chromosome = self.__update_best(best_chromosome, results)
+        self.__show_results(results, best_chromosome[0], is_final=True)
+        self.on_console.emit(
+            'Fitness evaluations: {} ({} unchanged chromosomes skipped)'.format(
+                self.nevaluated, self.nskipped))
+        if self.__batch_sizes:
+            self.on_console.emit(
+                'Mini-batch: {} iterations scored on {} to {} rows'.format(
+                    len(self.__batch_sizes), min(self.__batch_sizes),
+                    max(self.__batch_sizes)))
+        if self.cache is not None:
+            self.on_console.emit(
+                'Fitness cache: {} hits, {} misses ({:.1%} saved)'.format(
+                    self.cache.hits, self.cache.misses,
+                    self.cache.hits / max(self.cache.hits + self.cache.misses, 1)))
+        self.on_console.emit('The least error: %f' % best_chromosome[0])
+        self.on_console.emit(
             'The best chromosome: \n{}'.format(best_chromosome[1]))
         self.rbfn.load_model(best_chromosome[1])
-        self.sig_rbfn.emit(self.rbfn)
+        self.rbfn.metadata = {
+            'dataset': getattr(self.dataset, 'name', None),
+            'fitness': 'dataset' if self.tracks is None else 'simulation',
+            'error': float(best_chromosome[0]),
+            'iter_times': self.iter_times,
+            'population_size': self.population_size,
+            'is_aborted': self.abort,
+            'trained_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        self.on_rbfn.emit(self.rbfn)
 
-    @pyqtSlot()
     def stop(self):
-        if self.isRunning():
-            self.sig_console.emit("WARNING: User interrupts running thread. "
-                                  "The thread will be stop in next iteration. "
-                                  "Please wait a second...")
+        if self.is_running:
+            self.on_console.emit("WARNING: User interrupts running thread. "
+                                 "The thread will be stop in next iteration. "
+                                 "Please wait a second...")
 
         self.abort = True
 
-    def __create_chromosome(self):
-        chromosome = np.random.uniform(-1, 1, self.nneuron)
-        chromosome = np.append(chromosome, np.random.uniform(
-            *self.mean_range, (self.nneuron - 1) * self.data_dim))
-        return np.append(chromosome, np.random.uniform(
-            0.01, self.sd_max, self.nneuron - 1))
+    def __create_population(self, size):
+        return np.hstack((
+            np.random.uniform(-1, 1, (size, self.nneuron)),
+            np.random.uniform(*self.mean_range,
+                              (size, (self.nneuron - 1) * self.data_dim)),
+            np.random.uniform(0.01, self.sd_max, (size, self.nneuron - 1))))
+
+    def __evaluate(self, population):
+        """Score the chromosomes on the whole dataset (or tracks)."""
+        if self.cache is None:
+            return self.__evaluator.evaluate(population)
+        return self.cache.evaluate(population, self.__evaluator.evaluate)
 
     def __get_err_function_results(self):
-        if self.is_multicore:
-            with mp.Pool() as pool:
-                results = pool.map(functools.partial(err_func,
-                                                     dataset=self.dataset,
-                                                     rbfn=copy.deepcopy(self.rbfn)),
-                                   self.population)
-        else:
-            results = list()
-            for chromosome in self.population:
-                results.append(err_func(chromosome, self.dataset, self.rbfn))
-        return np.array(results)
-
-    def __roulette_wheel_selection(self, choices):
-        def weighted_random_choice(choices):
-            pick = random.uniform(0, sum(choices))
-            current = 0
-            for score, chromosome in choices.items():
-                current += score
-                if current > pick:
-                    return chromosome
-
-        pool = list()
-        for _ in range(self.population_size):
-            pool.append(weighted_random_choice(choices))
-
-        self.population = pool
-
-    def __tournament_selection(self, choices):
-        pool = list()
-        for _ in range(self.population_size):
-            pool.append(
-                choices[max(random.choices(list(choices.keys()), k=2))])
-        self.population = pool
+        # only the chromosomes changed since last evaluation are evaluated
+        dirty = np.flatnonzero(self.__is_dirty)
+        if len(dirty) > 0:
+            self.__results[dirty] = self.__evaluate(self.population[dirty])
+            self.__is_dirty[:] = False
+        self.nevaluated += len(dirty)
+        self.nskipped += self.population_size - len(dirty)
+        return self.__results
+
+    def __get_batch_size(self, iter_time):
+        """Get the size of mini-batch of the iteration, or None if the whole
+        dataset is used."""
+        if self.batch_size is None:
+            return None
+        # grow in log scale where the power cannot overflow
+        log_size = (math.log(self.batch_size)
+                    + iter_time * math.log(self.batch_growth))
+        if log_size >= math.log(len(self.inputs)):
+            return None
+        return max(int(round(math.exp(log_size))), 1)
+
+    def __get_batch_results(self, size):
+        """Score the whole population on a random mini-batch of dataset."""
+        self.__batch_sizes.append(size)
+        # the sorted indices read the memory mapped dataset in order
+        indices = np.sort(self.__sampler.randint(len(self.inputs), size=size))
+        self.__results[:] = self.__evaluator.evaluate(self.population,
+                                                      indices)
+        # the results on a batch are not comparable with the later ones
+        self.__is_dirty[:] = True
+        self.nevaluated += self.population_size
+        return self.__results
+
+    def __rescore_best(self, best_chromosome, results):
+        """Score the best chromosomes on the mini-batch (the elites, or the
+        best one without elitism) on the whole dataset, so that the least
+        error is exact."""
+        top = np.argsort(results, kind='stable')[:max(self.elitism, 1)]
+        full_results = self.__evaluate(self.population[top])
+        self.nevaluated += len(top)
+        idx = np.argmin(full_results)
+        if full_results[idx] < best_chromosome[0]:
+            return full_results[idx], self.population[top[idx]].copy()
+        return best_chromosome
+
+    def __update_best(self, best_chromosome, results):
+        idx = np.argmin(results)
+        if results[idx] < best_chromosome[0]:
+            # copy the chromosome out of the buffer which will be overwritten
+            return results[idx], self.population[idx].copy()
+        return best_chromosome
+
+    def __swap_buffers(self):
+        self.population, self.__offspring = self.__offspring, self.population
+
+    def __roulette_wheel_selection(self, scores, size):
+        bounds = np.cumsum(scores)
+        picks = np.random.uniform(0, bounds[-1], size)
+        indices = np.searchsorted(bounds, picks, side='right')
+        # guard against the floating point error at the upper bound
+        return np.minimum(indices, len(scores) - 1)
+
+    def __tournament_selection(self, scores, size):
+        contestants = np.random.randint(
+            len(scores), size=(size, self.tournament_size))
+        winners = np.argmax(scores[contestants], axis=1)
+        return contestants[np.arange(size), winners]
+
+    def __select(self, indices):
+        """Rearrange the population, along with the results and the dirty
+        flags, by the indices of chromosomes."""
+        np.take(self.population, indices, axis=0, out=self.__offspring)
+        self.__swap_buffers()
+        self.__results = self.__results[indices]
+        self.__is_dirty = self.__is_dirty[indices]
 
     def __crossover(self):
-        def pairwise(iterable):
-            iterator = iter(iterable)
-            return zip(iterator, iterator)
-
-        random.shuffle(self.population)
-        pairs = list(map(list, pairwise(self.population)))
-        for pair in pairs:
-            if random.uniform(0, 1) <= self.pc:
-                if bool(random.getrandbits(1)):
-                    # closer
-                    pair[0] = self.__chromosome_limiter(
-                        pair[0] + random.uniform(0, 1) * (pair[0] - pair[1]))
-                    pair[1] = self.__chromosome_limiter(
-                        pair[1] - random.uniform(0, 1) * (pair[0] - pair[1]))
-                else:
-                    # further
-                    pair[0] = self.__chromosome_limiter(
-                        pair[0] + random.uniform(0, 1) * (pair[1] - pair[0]))
-                    pair[1] = self.__chromosome_limiter(
-                        pair[1] - random.uniform(0, 1) * (pair[1] - pair[0]))
-        if len(self.population) % 2 == 1:
-            last_chromosome = self.population[-1]
-            self.population = list(itertools.chain.from_iterable(pairs))
-            self.population.append(last_chromosome)
-        else:
-            self.population = list(itertools.chain.from_iterable(pairs))
+        # the elites (population[:elitism]) are left untouched
+        self.__select(np.concatenate((
+            np.arange(self.elitism),
+            self.elitism + np.random.permutation(
+                self.population_size - self.elitism))))
+
+        # the pairs are (population[0], population[1]), (population[2],
+        # population[3]) and so on after the elites, and the coefficients of
+        # the pairs not chosen for crossover are zeros so that they are left
+        # unchanged
+        npair = (self.population_size - self.elitism) // 2
+        is_crossed = np.random.uniform(0, 1, npair) <= self.pc
+        # closer (+1) or further (-1)
+        directions = np.where(np.random.randint(2, size=npair), 1, -1)
+        coefs = (np.random.uniform(0, 1, (2, npair)) * directions
+                 * is_crossed)[:, :, np.newaxis]
+
+        end = self.elitism + npair * 2
+        parents0 = self.population[self.elitism:end:2]
+        parents1 = self.population[self.elitism + 1:end:2]
+        children0 = self.__offspring[self.elitism:end:2]
+        children1 = self.__offspring[self.elitism + 1:end:2]
+        np.subtract(parents0, parents1, out=children0)
+        children0 *= coefs[0]
+        children0 += parents0
+        self.__chromosome_limiter(children0)
+        np.subtract(children0, parents1, out=children1)
+        children1 *= -coefs[1]
+        children1 += parents1
+        self.__chromosome_limiter(children1)
+        self.__offspring[:self.elitism] = self.population[:self.elitism]
+        self.__offspring[end:] = self.population[end:]
+        self.__swap_buffers()
+        self.__is_dirty[self.elitism:end:2] |= is_crossed
+        self.__is_dirty[self.elitism + 1:end:2] |= is_crossed
 
     def __mutation(self):
-        for idx, _ in enumerate(self.population):
-            if random.uniform(0, 1) <= self.pm:
-                if bool(random.getrandbits(1)):
-                    s = -self.mutation_scale
-                else:
-                    s = self.mutation_scale
-                self.population[idx] = self.__chromosome_limiter(
-                    self.population[idx] + s * self.__create_chromosome())
-
-    def __chromosome_limiter(self, chromosome):
-        np.clip(chromosome[:self.nneuron], -1,
-                1, out=chromosome[:self.nneuron])
-        np.clip(chromosome[self.nneuron:-(self.nneuron - 1)], *
-                self.mean_range, out=chromosome[self.nneuron:-(self.nneuron - 1)])
-        np.clip(chromosome[-(self.nneuron - 1):], 0.001,
-                None, out=chromosome[-(self.nneuron - 1):])
-        return chromosome
-
-    def __show_results(self, results, best):
-        for res in results:
-            time.sleep(0.001)
-            self.sig_current_error.emit(res)
-        self.sig_iter_error.emit(sum(results) / len(results), best)
-
-
-def err_func(chromosome, dataset, rbfn):
-    """Calculate the error function for each chromosome.
-    This function is specially designed to be pickable for multiprocessing.
-
-    Args:
-        chromosome (list of floats): The chromosome which is the parameters of
-            RBFN model.
-        dataset (list of TrainingData): The training dataset.
-        rbfn (RBFN): The RBFN model which must be deep copied for different
-            parameters in output calculation.
-
-    Returns:
-        float: The result of fitting function.
-    """
-
-    rbfn.load_model(chromosome)
-    res = sum(abs(d.o - rbfn.output(d.i, antinorm=True)) for d in dataset)
-    return res / len(dataset)
+        # the elites (population[:elitism]) are left untouched
+        is_mutated = np.zeros(self.population_size, dtype=bool)
+        is_mutated[self.elitism:] = np.random.uniform(
+            0, 1, self.population_size - self.elitism) <= self.pm
+        nmutated = np.count_nonzero(is_mutated)
+        scales = np.where(np.random.randint(2, size=nmutated),
+                          -self.mutation_scale, self.mutation_scale)
+        self.population[is_mutated] += (scales[:, np.newaxis]
+                                        * self.__create_population(nmutated))
+        self.__chromosome_limiter(self.population)
+        self.__is_dirty |= is_mutated
+
+    def __chromosome_limiter(self, chromosomes):
+        np.clip(chromosomes, self.__lower_bounds, self.__upper_bounds,
+                out=chromosomes)
+        return chromosomes
+
+    def __show_results(self, results, best, is_final=False):
+        # publish the errors of whole population at most once per interval
+        now = time.perf_counter()
+        if is_final or now - self.__last_progress_time >= self.progress_interval:
+            self.__last_progress_time = now
+            self.on_current_errors.emit(results.copy())
+        self.on_iter_error.emit(results.mean(), best)
+
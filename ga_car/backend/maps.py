@@ -0,0 +1,148 @@
+"""Read the maps of the car simulator, and compile them into binary files
+which are loaded by memory mapping.
+
+A compiled map is a binary file of the layout in `binfile`, whose header
+stores the scalars of the map and the stamp of the source file.
+"""
+
+import collections
+import pathlib
+
+import numpy as np
+
+from . import binfile
+from .car import Car
+from .planecoord import LineSegArray2D
+from .spatial import UniformGrid
+
+MAGIC = b'GACARMAP'
+VERSION = 1
+
+
+def read_map(filepath):
+    """ Read the data of a map from its text file. """
+    with pathlib.Path(filepath).open() as casefile:
+        contents = [tuple(map(float, line.split(',')))
+                    for line in casefile]
+    return {
+        "start_pos": (contents[0][0], contents[0][1]),
+        "start_angle": contents[0][2],
+        "end_area_lt": contents[1],  # ending area - left-top
+        "end_area_rb": contents[2],  # ending area - right-bottom
+        "route_edge": contents[3:]
+    }
+
+
+def source_stamp(filepath):
+    """Get the stamp (modified time and size) of a source file which decides
+    if its compiled map is outdated."""
+    stat = pathlib.Path(filepath).stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def compile_map(src, dst, with_index=None):
+    """Compile the text file of a map into a binary file.
+
+    Args:
+        src (str): The path of the text file.
+        dst (str): The path of the binary file.
+        with_index (bool, optional): Defaults to None. If the spatial index of
+            walls is compiled. Compile it for the maps with at least
+            `Car.index_threshold` walls if None.
+    """
+
+    data = read_map(src)
+    points = np.asarray(data['route_edge'], dtype=float).reshape(-1, 2)
+    walls = LineSegArray2D(points)
+    arrays = dict(walls.arrays(), points=points)
+    header = {
+        'version': VERSION,
+        'source': source_stamp(src),
+        'start_pos': list(data['start_pos']),
+        'start_angle': data['start_angle'],
+        'end_area_lt': list(data['end_area_lt']),
+        'end_area_rb': list(data['end_area_rb']),
+        'grid': None,
+    }
+    if with_index is None:
+        with_index = len(walls) >= Car.index_threshold
+    if with_index:
+        grid = UniformGrid(walls)
+        header['grid'] = grid.params()
+        arrays.update(cell_items=grid.cell_items,
+                      cell_offsets=grid.cell_offsets)
+    binfile.write_file(dst, MAGIC, header, arrays)
+
+
+def read_header(filepath):
+    """Read the header of a compiled map.
+
+    Returns:
+        tuple: (header, the offset where the arrays start), or None if the file
+            is not a compiled map of current version.
+    """
+
+    return binfile.read_header(filepath, MAGIC, VERSION)
+
+
+def load_map(filepath):
+    """Load a compiled map where every array is memory mapped (read only).
+
+    Returns:
+        dict: The same items as `read_map` where `route_edge` is an array,
+            plus `walls` (LineSegArray2D) and `wall_index` (UniformGrid or
+            None).
+    """
+
+    result = read_header(filepath)
+    if result is None:
+        raise ValueError('"{}" is not a compiled map.'.format(filepath))
+    header, data_start = result
+    arrays = binfile.load_arrays(filepath, header, data_start)
+    walls = LineSegArray2D.from_arrays(arrays)
+    wall_index = None
+    if header['grid'] is not None:
+        wall_index = UniformGrid.from_arrays(walls, header['grid'],
+                                             arrays['cell_items'],
+                                             arrays['cell_offsets'])
+    return {
+        "start_pos": tuple(header['start_pos']),
+        "start_angle": header['start_angle'],
+        "end_area_lt": tuple(header['end_area_lt']),
+        "end_area_rb": tuple(header['end_area_rb']),
+        "route_edge": arrays['points'],
+        "walls": walls,
+        "wall_index": wall_index
+    }
+
+
+def load_maps(folderpath='maps', cache_dir=None, with_index=None):
+    """Load every map in `folderpath` folder from their compiled files, where
+    the maps are compiled again only if their text files have been changed.
+
+    Args:
+        folderpath (str, optional): Defaults to 'maps'. The folder of the text
+            files of maps.
+        cache_dir (str, optional): Defaults to None. The folder of compiled
+            maps. Use the `.cache` folder in `folderpath` if None.
+        with_index (bool, optional): Defaults to None. See `compile_map`.
+
+    Returns:
+        collections.OrderedDict: The maps returned by `load_map` keyed by
+            their names.
+    """
+
+    folderpath = pathlib.Path(folderpath)
+    if cache_dir is None:
+        cache_dir = folderpath / '.cache'
+    cache_dir = pathlib.Path(cache_dir)
+    maps = {}
+    for filepath in folderpath.glob("*.txt"):
+        dst = cache_dir / (filepath.stem + '.map')
+        result = read_header(dst)
+        if (result is None or result[0]['source'] != source_stamp(filepath)
+                or (with_index is not None
+                    and (result[0]['grid'] is not None) != with_index)):
+            compile_map(filepath, dst, with_index)
+        maps[filepath.stem] = load_map(dst)
+    return collections.OrderedDict(sorted(maps.items()))
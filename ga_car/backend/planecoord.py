@@ -1,186 +1,249 @@
-""" Define the line in 2D plane and its basic methods. """
-
-from decimal import Decimal
-import math
+""" Define the line segments in 2D plane and their vectorized queries. """
 
 import numpy as np
 
 
-class Line2D(object):
-    def __init__(self, arg1, arg2, arg3=None):
-        """Create a 2D-plane line.
+class LineSegArray2D(object):
+    # the upper bound of the # of elements of temporary tensors in batches
+    max_batch_elements = 2**22
+    # the names of the precomputed arrays
+    array_names = ('pt1', 'pt2', 'vec', 'inv_sq_len', 'lower', 'upper')
+
+    def __init__(self, points):
+        """A polyline of 2D line segments stored as arrays, precomputed once
+        for vectorized queries against every segment.
 
         Args:
-            arg1 (tuple or float): If the type is tuple, this is the first point
-                in two-points form. Otherwise, this is the slope or the
-                x-coefficient.
-            arg2 (tuple or float): If the type is tuple, this is the first point
-                in two-points form. Otherwise, this is the y-intercept or the
-                y-coefficient.
-            arg3 (float, optional): Defaults to None. If not None, arg1, arg2,
-                and arg3 are the x-coefficient, y-coefficient, and constant
-                repectively in general (standard) form (ax + by = c).
+            points (list): The M + 1 end points of the M connected line
+                segments.
         """
 
-        if arg3 is None:
-            # two-points form
-            if isinstance(arg1, (tuple, list)):
-                arg1 = (Decimal(str(arg1[0])), Decimal(str(arg1[1])))
-                arg2 = (Decimal(str(arg2[0])), Decimal(str(arg2[1])))
-                # vertical line
-                if arg1[0] == arg2[0]:
-                    self.x_coef, self.y_coef, self.const = 1, 0, arg1[0]
-                # oblique line
-                else:
-                    m = (arg1[1] - arg2[1]) / (arg1[0] - arg2[0])
-                    c = arg1[1] - m * arg1[0]
-                    self.x_coef, self.y_coef, self.const = self.si2general(
-                        m, c)
-            # slope-intercept form
-            else:
-                self.x_coef, self.y_coef, self.const = self.si2general(
-                    Decimal(arg1), Decimal(arg2))
-        else:
-            self.x_coef, self.y_coef, self.const = Decimal(
-                arg1), Decimal(arg2), Decimal(arg3)
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.pt1 = points[:-1]
+        self.pt2 = points[1:]
+        self.vec = self.pt2 - self.pt1
+        sq_len = (self.vec ** 2).sum(axis=1)
+        # the degenerate segments (points) get zeros
+        self.inv_sq_len = np.divide(1, sq_len, out=np.zeros_like(sq_len),
+                                    where=sq_len > 0)
+        # the bounding boxes of segments
+        self.lower = np.minimum(self.pt1, self.pt2)
+        self.upper = np.maximum(self.pt1, self.pt2)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Restore the segments from their precomputed arrays (e.g. memory
+        mapped ones) without computing them again.
+
+        Args:
+            arrays (dict): The arrays keyed by `array_names`.
+
+        Returns:
+            LineSegArray2D: The segments.
+        """
+
+        segs = cls.__new__(cls)
+        for name in cls.array_names:
+            setattr(segs, name, arrays[name])
+        return segs
 
-    def y(self, x):
-        return 0 if self.y_coef == 0 else (self.const - self.x_coef * x) / self.y_coef
+    def arrays(self):
+        """Get the precomputed arrays keyed by `array_names`."""
+        return {name: getattr(self, name) for name in self.array_names}
 
-    def x(self, y):
-        return 0 if self.x_coef == 0 else (self.const - self.y_coef * y) / self.x_coef
+    def __len__(self):
+        return len(self.pt1)
 
-    def intersection(self, line):
-        """Get the point of intersection between two lines. May loss precision while
-        calculating the result from `Decimal` to `float`.
+    def point_dists(self, pt, indices=None):
+        """Get the distances between a point and every segment.
 
         Args:
-            line (Line2D): The 2D line to calculate with.
+            pt (tuple): The target point.
+            indices (numpy.ndarray, optional): Defaults to None. Only measure
+                the segments of these indices if not None.
 
         Returns:
-            ndarray: The point of intersection.
+            numpy.ndarray: The distances.
         """
 
-        coefs = np.array([[float(self.x_coef), float(self.y_coef)],
-                          [float(line.x_coef), float(line.y_coef)]])
-        consts = np.array([float(self.const), float(line.const)])
-        try:
-            inter = np.linalg.solve(coefs, consts)
-        except np.linalg.LinAlgError:
-            # infinite or none solution
-            return None
-        else:
-            # exactly one solution
-            return inter
+        return np.sqrt(self.__point_sq_dists(pt, indices))
 
-    def point_dist(self, pt):
-        """Get the distance between a point and self.
+    def __point_sq_dists(self, pt, indices=None):
+        if indices is None:
+            pt1, vec, inv_sq_len = self.pt1, self.vec, self.inv_sq_len
+        else:
+            pt1, vec, inv_sq_len = (self.pt1[indices], self.vec[indices],
+                                    self.inv_sq_len[indices])
+        offsets = np.asarray(pt, dtype=float) - pt1
+        # the parameter of the closest point on each segment
+        ts = np.einsum('ij,ij->i', offsets, vec)
+        ts *= inv_sq_len
+        np.minimum(np.maximum(ts, 0, out=ts), 1, out=ts)
+        offsets -= ts[:, np.newaxis] * vec
+        return np.einsum('ij,ij->i', offsets, offsets)
+
+    def is_near(self, pt, radius, indices=None):
+        """Check if any segment is within `radius` to the point. The segments
+        whose bounding boxes inflated by `radius` do not cover the point are
+        rejected before measuring the distances.
 
         Args:
-            pt (tuple): the target point.
+            pt (tuple): The target point.
+            radius (float): The maximum distance.
+            indices (numpy.ndarray, optional): Defaults to None. Only check the
+                segments of these indices if not None.
 
         Returns:
-            float: the distance between the given point and self (line).
+            bool: If any segment is within `radius` to the point.
         """
-        return abs(float(self.x_coef) * pt[0]
-                   + float(self.y_coef * pt[1])
-                   - float(self.const)) / math.sqrt(self.x_coef ** 2
-                                                    + self.y_coef ** 2)
 
-    @staticmethod
-    def si2general(slope, y_intercept):
-        """Convert the parameter of slope-intercept form into the one of general
-        form.
+        pt = np.asarray(pt, dtype=float)
+        lower, upper = self.lower, self.upper
+        if indices is not None:
+            lower, upper = lower[indices], upper[indices]
+        # the Chebyshev distances between the point and the bounding boxes
+        gaps = np.maximum(lower - pt, pt - upper)
+        candidates = np.flatnonzero(np.maximum(gaps[:, 0], gaps[:, 1])
+                                    <= radius)
+        if len(candidates) == 0:
+            return False
+        if indices is not None:
+            candidates = np.asarray(indices)[candidates]
+        return bool((self.__point_sq_dists(pt, candidates)
+                     <= radius ** 2).any())
+
+    def ray_intersections(self, origin, directions, indices=None):
+        """Get the closest intersection of each ray against every segment by
+        solving `origin + t * direction = pt1 + u * vec` where `t > 0` and
+        `0 <= u <= 1`.
 
         Args:
-            slope (float): the slope of the 2D line.
-            y_intercept (float): the y_intercept of the 2D line.
+            origin (tuple): The start point of all rays.
+            directions (numpy.ndarray): The K x 2 unit direction vectors.
+            indices (numpy.ndarray, optional): Defaults to None. Only test the
+                segments of these indices if not None.
 
         Returns:
-            tuple: a tuple containing (x coefficient, y coefficient, constant
-            term).
+            tuple: (intersections, distances) where intersections is a K x 2
+                array and distances is an array of length K. The rays without
+                any intersection get NaN intersections and infinite distances.
         """
 
-        return slope, -1, -y_intercept
+        origin = np.asarray(origin, dtype=float)
+        directions = np.asarray(directions, dtype=float)
+        if indices is None:
+            pt1, vec = self.pt1, self.vec
+        else:
+            pt1, vec = self.pt1[indices], self.vec[indices]
+        offsets = pt1 - origin
+        # 2D cross products between rays (K) and segments (M): K x M
+        denoms = (directions[:, 0, np.newaxis] * vec[:, 1]
+                  - directions[:, 1, np.newaxis] * vec[:, 0])
+        t_nums = offsets[:, 0] * vec[:, 1] - offsets[:, 1] * vec[:, 0]
+        u_nums = (offsets[:, 0] * directions[:, 1, np.newaxis]
+                  - offsets[:, 1] * directions[:, 0, np.newaxis])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ts = t_nums / denoms
+            us = u_nums / denoms
+        ts[~((denoms != 0) & (ts > 0) & (us >= 0) & (us <= 1))] = np.inf
+        dists = ts.min(axis=1, initial=np.inf)
+        with np.errstate(invalid='ignore'):
+            intersections = origin + dists[:, np.newaxis] * directions
+        intersections[np.isinf(dists)] = np.nan
+        return intersections, dists
+
+    def batch_ray_intersections(self, origins, directions):
+        """Get the closest intersection of each ray of many origins against
+        every segment. The same as `ray_intersections` but for a batch.
 
+        Args:
+            origins (numpy.ndarray): The N x 2 start points of rays.
+            directions (numpy.ndarray): The N x K x 2 unit direction vectors
+                where `directions[n]` are the rays starting at `origins[n]`.
 
-class LineSeg2D(Line2D):
-    def __init__(self, arg1, arg2):
-        super().__init__(arg1, arg2)
-        self.pt1, self.pt2 = arg1, arg2
-        self.xmax, self.xmin = max(arg1[0], arg2[0]), min(arg1[0], arg2[0])
-        self.ymax, self.ymin = max(arg1[1], arg2[1]), min(arg1[1], arg2[1])
+        Returns:
+            tuple: (intersections, distances) where intersections is a
+                N x K x 2 array and distances is a N x K array.
+        """
 
-    def intersection(self, line):
-        """Get the point of intersection between self (a line segment) and a
-        line or line segment. May loss precision while calculating the result
-        from `Decimal` to `float`.
+        origins = np.asarray(origins, dtype=float)
+        directions = np.asarray(directions, dtype=float)
+        dists = np.full(directions.shape[:2], np.inf)
+        # bound the size of N x K x M temporary tensors
+        chunk_size = max(1, self.max_batch_elements
+                         // max(directions.shape[1] * len(self), 1))
+        for start in range(0, len(origins), chunk_size):
+            stop = start + chunk_size
+            dx = directions[start:stop, :, 0, np.newaxis]
+            dy = directions[start:stop, :, 1, np.newaxis]
+            # offsets from origins to segments: N x M
+            ox = self.pt1[:, 0] - origins[start:stop, 0, np.newaxis]
+            oy = self.pt1[:, 1] - origins[start:stop, 1, np.newaxis]
+            denoms = dx * self.vec[:, 1] - dy * self.vec[:, 0]
+            t_nums = (ox * self.vec[:, 1] - oy * self.vec[:, 0])[:, np.newaxis]
+            u_nums = ox[:, np.newaxis] * dy - oy[:, np.newaxis] * dx
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ts = t_nums / denoms
+                us = u_nums / denoms
+            ts[~((denoms != 0) & (ts > 0) & (us >= 0) & (us <= 1))] = np.inf
+            dists[start:stop] = ts.min(axis=2, initial=np.inf)
+        with np.errstate(invalid='ignore'):
+            intersections = (origins[:, np.newaxis]
+                             + dists[..., np.newaxis] * directions)
+        intersections[np.isinf(dists)] = np.nan
+        return intersections, dists
+
+    def batch_is_near(self, pts, radius):
+        """Check if any segment is within `radius` to each point. The same as
+        `is_near` but for a batch.
 
         Args:
-            line (Line2D or LineSeg2D): The 2D line or line segment to calculate
-                with.
+            pts (numpy.ndarray): The N x 2 target points.
+            radius (float): The maximum distance.
 
         Returns:
-            ndarray: The point of intersection.
-
-        Raises:
-            TypeError: line should only be Line2D or LineSeg2D.
+            numpy.ndarray: N booleans.
         """
-        inter = super().intersection(line)
-        if inter is None:
-            return None
-        if type(line) == Line2D:
-            if self.pt1[0] - self.pt2[0] == 0:
-                # self is vertical line segment
-                if self.ymin <= inter[1] <= self.ymax:
-                    return inter
-            elif self.xmin <= inter[0] <= self.xmax:
-                # self is oblique line
-                return inter
-            else:
-                return None
-        elif type(line) == LineSeg2D:
-            if self.pt1[0] - self.pt2[0] == 0:
-                # vertical line segment (self)
-                if (self.ymin <= inter[1] <= self.ymax
-                        and line.xmin <= inter[0] <= line.xmax):
-                    return inter
-            elif line.ranging_pt1[0] - line.pt2[0] == 0:
-                # vertical line segment (line)
-                if (line.ymin <= inter[1] <= line.ymax
-                        and self.xmin <= inter[0] <= self.xmax):
-                    return inter
-            elif (self.xmin <= inter[0] <= self.xmax
-                  and line.xmin <= inter[0] <= line.xmax):
-                return inter
-            else:
-                return None
-        else:
-            raise TypeError("'line' should be a instance of Line2D or "
-                            "LineSeg2D")
 
-    def point_dist(self, pt):
-        """Get the distance between a point and self.
+        pts = np.asarray(pts, dtype=float).reshape(-1, 2)
+        res = np.zeros(len(pts), dtype=bool)
+        # bound the size of N x M temporary tensors
+        chunk_size = max(1, self.max_batch_elements // max(len(self), 1))
+        for start in range(0, len(pts), chunk_size):
+            chunk = pts[start:start + chunk_size]
+            # the (point, segment) pairs passing the bounding box rejection
+            gaps = np.maximum(self.lower - chunk[:, np.newaxis],
+                              chunk[:, np.newaxis] - self.upper).max(axis=2)
+            pt_ids, seg_ids = np.nonzero(gaps <= radius)
+            offsets = chunk[pt_ids] - self.pt1[seg_ids]
+            vec = self.vec[seg_ids]
+            ts = np.einsum('ij,ij->i', offsets, vec) * self.inv_sq_len[seg_ids]
+            np.minimum(np.maximum(ts, 0, out=ts), 1, out=ts)
+            offsets -= ts[:, np.newaxis] * vec
+            is_near = np.einsum('ij,ij->i', offsets, offsets) <= radius ** 2
+            res[start:start + chunk_size] = np.bincount(
+                pt_ids[is_near], minlength=len(chunk)) > 0
+        return res
+
+    def batch_min_dists(self, pts):
+        """Get the distance between each point and its closest segment.
 
         Args:
-            pt (tuple): the target point.
+            pts (numpy.ndarray): The N x 2 target points.
 
         Returns:
-            float: the distance between the given point and self (line segment).
+            numpy.ndarray: N distances.
         """
 
-        seg_len = dist(self.pt1, self.pt2)
-        if seg_len == 0:
-            return dist(pt, self.pt1)
-        t = max(0, min(1, ((pt[0] - self.pt1[0])
-                           * (self.pt2[0] - self.pt1[0])
-                           + (pt[1] - self.pt1[1])
-                           * (self.pt2[1] - self.pt1[1]))
-                       / seg_len ** 2))
-        return dist(pt, (self.pt1[0] + t * (self.pt2[0] - self.pt1[0]),
-                         self.pt1[1] + t * (self.pt2[1] - self.pt1[1])))
-
-
-def dist(pt0, pt1):
-    """Return the distance between pt0 and pt1."""
-    return math.sqrt(sum(map(lambda a, b: (a - b)**2, pt0, pt1)))
+        pts = np.asarray(pts, dtype=float).reshape(-1, 2)
+        sq_dists = np.empty(len(pts))
+        # bound the size of N x M temporary tensors
+        chunk_size = max(1, self.max_batch_elements // max(len(self), 1))
+        for start in range(0, len(pts), chunk_size):
+            offsets = pts[start:start + chunk_size, np.newaxis] - self.pt1
+            ts = np.einsum('nmj,mj->nm', offsets, self.vec) * self.inv_sq_len
+            np.minimum(np.maximum(ts, 0, out=ts), 1, out=ts)
+            offsets -= ts[..., np.newaxis] * self.vec
+            sq_dists[start:start + chunk_size] = np.einsum(
+                'nmj,nmj->nm', offsets, offsets).min(axis=1, initial=np.inf)
+        return np.sqrt(sq_dists)
@@ -3,12 +3,22 @@ import random
 
 import numpy as np
 
+from . import binfile
+
+MAGIC = b'GACARNET'
+VERSION = 1
+
 
 class RBFN(object):
+    # the outputs are scaled to wheel angles in [-output_scale, output_scale]
+    output_scale = 40
+
     def __init__(self, nneuron, mean_range, sd_max=1):
         self.neurons = [Neuron(sd=random.uniform(0, sd_max),
                                mean_range=mean_range) for j in range(nneuron)]
         self.neurons.insert(0, Neuron(is_threshold=True))
+        # the JSON serializable information of training saved with the model
+        self.metadata = dict()
 
     def output(self, data, antinorm=False):
         data = np.array(data)
@@ -16,10 +26,45 @@ class RBFN(object):
             neuron.input_data(data)
         res = sum(n.output for n in self.neurons)
         if antinorm:
-            return self.__antinormalize(res)
+            return self.antinormalize(res)
         return res
 
-    def load_model(self, params):
+    def output_batch(self, data, antinorm=False):
+        """Calculate the outputs of a whole batch of input data at once.
+
+        Args:
+            data (numpy.ndarray): The N x D matrix of input data where each row
+                is one input.
+            antinorm (bool, optional): Defaults to False. If the outputs should
+                be antinormalized.
+
+        Returns:
+            numpy.ndarray: The N outputs.
+        """
+
+        data = np.asarray(data, dtype=float)
+        for neuron in self.neurons[1:]:
+            if neuron.mean is None:
+                neuron.mean = np.random.uniform(*neuron.mean_range,
+                                                size=data.shape[1])
+        weights = np.array([n.sw for n in self.neurons[1:]], dtype=float)
+        means = np.array([n.mean for n in self.neurons[1:]], dtype=float)
+        sds = np.array([n.sd for n in self.neurons[1:]], dtype=float)
+
+        # squared distances between every input and every mean (N x K)
+        sq_dists = ((data ** 2).sum(axis=1)[:, np.newaxis]
+                    - 2 * data.dot(means.T) + (means ** 2).sum(axis=1))
+        np.maximum(sq_dists, 0, out=sq_dists)
+        valid = sds > 0
+        activations = np.zeros_like(sq_dists)
+        activations[:, valid] = np.exp(
+            sq_dists[:, valid] / (-2 * sds[valid] ** 2))
+        res = activations.dot(weights) + self.neurons[0].sw
+        if antinorm:
+            return self.antinormalize(res)
+        return res
+
+    def load_model(self, params, copy=True):
         """Load every parameters into the RBFN model.
 
         Args:
@@ -30,6 +75,8 @@ class RBFN(object):
             |`params[0]`  |`params[1:n]`|`params[n:-(n - 1)]`|`params[-(n - 1):]`|
 
                 where `n` is # of neurons.
+            copy (bool, optional): Defaults to True. If the means are copied,
+                or they are the views of `params` (an array) otherwise.
         """
 
         nneuron = len(self.neurons)
@@ -41,12 +88,113 @@ class RBFN(object):
         data_dim = int(len(means) / (nneuron - 1))
         for idx, neuron in enumerate(self.neurons[1:]):
             neuron.sw = weights[idx]
-            neuron.mean = np.array(means[idx * data_dim:(idx + 1) * data_dim])
+            mean = means[idx * data_dim:(idx + 1) * data_dim]
+            neuron.mean = np.array(mean) if copy else np.asarray(mean)
             neuron.sd = sds[idx]
 
-    @staticmethod
-    def __antinormalize(value):
-        return max(min(value * 40, 40), -40)
+    def dump_model(self):
+        """Get every parameters of the RBFN model, which is the reverse of
+        `load_model`. The means of neurons must have been set.
+
+        Returns:
+            numpy.ndarray: The parameters in the spec of `load_model`.
+
+        Raises:
+            ValueError: If the model has not been trained or loaded.
+        """
+
+        neurons = self.neurons[1:]
+        if any(n.mean is None for n in neurons):
+            raise ValueError('The means of RBFN are not set. Train or load '
+                             'the model first.')
+        return np.concatenate((
+            [self.neurons[0].sw], [n.sw for n in neurons],
+            np.concatenate([n.mean for n in neurons]),
+            [n.sd for n in neurons])).astype(float)
+
+    def save(self, path):
+        """Save the model as a binary file of the layout in `binfile`, whose
+        header stores the # of neurons, the input dimension, the output scale,
+        the range of means and `metadata`.
+
+        Args:
+            path (str): The path of the file.
+
+        Raises:
+            ValueError: If the model has not been trained or loaded.
+        """
+
+        params = self.dump_model()
+        header = {
+            'version': VERSION,
+            'nneuron': len(self.neurons) - 1,
+            'data_dim': len(self.neurons[1].mean),
+            'output_scale': self.output_scale,
+            'mean_range': [float(v) for v in self.neurons[1].mean_range],
+            'metadata': self.metadata,
+        }
+        binfile.write_file(path, MAGIC, header, {'params': params})
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Load the model saved by `save`.
+
+        Args:
+            path (str): The path of the file.
+            mmap_mode (str, optional): Defaults to None. The mode of the
+                memory map where the means of neurons are the views of it
+                without copying, or read the parameters into memory if None.
+
+        Returns:
+            RBFN: The loaded model.
+        """
+
+        result = binfile.read_header(path, MAGIC, VERSION)
+        if result is None:
+            raise ValueError('"{}" is not a saved RBFN model.'.format(path))
+        header, data_start = result
+        if header['output_scale'] != cls.output_scale:
+            raise ValueError('The output scale of model "{}" is {} but {} is '
+                             'expected.'.format(path, header['output_scale'],
+                                                cls.output_scale))
+        params = binfile.load_arrays(path, header, data_start,
+                                     mmap_mode)['params']
+        nneuron = header['nneuron']
+        if len(params) != 1 + nneuron * (header['data_dim'] + 2):
+            raise ValueError('The parameters of model "{}" are broken.'.format(
+                path))
+
+        rbfn = cls(nneuron, tuple(header['mean_range']))
+        rbfn.load_model(params, copy=mmap_mode is None)
+        rbfn.metadata = header['metadata']
+        return rbfn
+
+    @classmethod
+    def antinormalize(cls, value):
+        return np.clip(value * cls.output_scale, -cls.output_scale,
+                       cls.output_scale)
+
+
+def decode_params(params, nneuron):
+    """Split the parameters of RBFN models into their components. The spec of
+    the parameters is the same as the one in `RBFN.load_model`.
+
+    Args:
+        params (numpy.ndarray): A chromosome or a P x L matrix whose rows are
+            chromosomes.
+        nneuron (int): The # of neurons including the threshold one.
+
+    Returns:
+        tuple: (threshold SWs, SWs, means, SDs) whose shapes are (...),
+            (..., n - 1), (..., n - 1, D) and (..., n - 1) respectively.
+    """
+
+    params = np.asarray(params, dtype=float)
+    means = params[..., nneuron:-(nneuron - 1)]
+    data_dim = means.shape[-1] // (nneuron - 1)
+    return (params[..., 0], params[..., 1:nneuron],
+            means.reshape(means.shape[:-1] + (nneuron - 1, data_dim)),
+            params[..., -(nneuron - 1):])
 
 
 class Neuron(object):
@@ -0,0 +1,180 @@
+"""Define a precomputed lookup field of radar distances over a map."""
+
+import math
+import time
+
+import numpy as np
+
+from .planecoord import LineSegArray2D
+
+
+class SensorField(object):
+    def __init__(self, walls, cell_size=1, nheading=72):
+        """A grid of sample nodes over the map where each node stores the
+        distance of the ray to the closest wall in each of `nheading` evenly
+        spaced headings, and the clearance (distance to the closest wall)
+        of the node. The queries are interpolated from the nodes around them,
+        so the radar distances and collisions cost the same regardless of
+        the # of walls.
+
+        The rays of the nodes outside the map may be infinite and make the
+        interpolated distances of the points close to the walls infinite, so
+        `cell_size` should be smaller than the radius of cars for those
+        points being collided already.
+
+        Args:
+            walls (list or LineSegArray2D): a list with all the edge points of
+                the map, or the walls built from them.
+            cell_size (float, optional): Defaults to 1. The spacing of nodes.
+            nheading (int, optional): Defaults to 72. The # of headings of
+                rays at each node.
+        """
+
+        start = time.perf_counter()
+        if not isinstance(walls, LineSegArray2D):
+            walls = LineSegArray2D(walls)
+        self.walls = walls
+        self.cell_size = cell_size
+        self.nheading = nheading
+        self.origin = walls.lower.min(axis=0) - cell_size
+        width, height = walls.upper.max(axis=0) + cell_size - self.origin
+        self.nx = int(math.ceil(width / cell_size)) + 1
+        self.ny = int(math.ceil(height / cell_size)) + 1
+
+        xs = self.origin[0] + np.arange(self.nx) * cell_size
+        ys = self.origin[1] + np.arange(self.ny) * cell_size
+        nodes = np.stack(np.meshgrid(xs, ys), axis=2).reshape(-1, 2)
+        headings = np.arange(nheading) * (2 * math.pi / nheading)
+        directions = np.column_stack((np.cos(headings), np.sin(headings)))
+        _, dists = walls.batch_ray_intersections(
+            nodes, np.broadcast_to(directions, (len(nodes),) + directions.shape))
+        self.dists = dists.reshape(self.ny, self.nx, nheading).astype(np.float32)
+        self.clearances = walls.batch_min_dists(nodes).reshape(
+            self.ny, self.nx).astype(np.float32)
+        self.build_time = time.perf_counter() - start
+
+    def __corners(self, pts):
+        """Get the indices of the left-bottom nodes around the points and the
+        interpolation weights toward the right and top ones."""
+        coords = (np.asarray(pts, dtype=float) - self.origin) / self.cell_size
+        ix = np.clip(np.floor(coords[..., 0]).astype(int), 0, self.nx - 2)
+        iy = np.clip(np.floor(coords[..., 1]).astype(int), 0, self.ny - 2)
+        tx = np.clip(coords[..., 0] - ix, 0, 1)
+        ty = np.clip(coords[..., 1] - iy, 0, 1)
+        return ix, iy, tx, ty
+
+    def ray_dists(self, pts, radians):
+        """Get the radar distances by the trilinear interpolation over the
+        positions and headings.
+
+        Args:
+            pts (numpy.ndarray): The N x 2 positions.
+            radians (numpy.ndarray): The N x K headings in radian of the rays
+                starting at each position.
+
+        Returns:
+            numpy.ndarray: The N x K distances which are infinite if the rays
+                of the nodes around detect nothing.
+        """
+
+        ix, iy, tx, ty = self.__corners(pts)
+        ix, iy = ix[:, np.newaxis], iy[:, np.newaxis]
+        tx, ty = tx[:, np.newaxis], ty[:, np.newaxis]
+        coords = np.mod(radians, 2 * math.pi) * (self.nheading / (2 * math.pi))
+        ih = np.minimum(np.floor(coords).astype(int), self.nheading - 1)
+        th = coords - ih
+        dists = np.zeros(np.shape(radians))
+        with np.errstate(invalid='ignore'):
+            for dx, wx in ((0, 1 - tx), (1, tx)):
+                for dy, wy in ((0, 1 - ty), (1, ty)):
+                    for dh, wh in ((0, 1 - th), (1, th)):
+                        weights = wx * wy * wh
+                        values = self.dists[iy + dy, ix + dx,
+                                            (ih + dh) % self.nheading]
+                        # skip the infinite values of zero weights
+                        dists += np.where(weights > 0, weights * values, 0)
+        return dists
+
+    def clearance(self, pts):
+        """Get the distances to the closest walls by the bilinear
+        interpolation.
+
+        Args:
+            pts (numpy.ndarray): The N x 2 positions.
+
+        Returns:
+            numpy.ndarray: N distances.
+        """
+
+        ix, iy, tx, ty = self.__corners(pts)
+        return ((1 - ty) * ((1 - tx) * self.clearances[iy, ix]
+                            + tx * self.clearances[iy, ix + 1])
+                + ty * ((1 - tx) * self.clearances[iy + 1, ix]
+                        + tx * self.clearances[iy + 1, ix + 1]))
+
+    def is_near(self, pts, radius):
+        """Check if any wall is within `radius` to each point.
+
+        Args:
+            pts (numpy.ndarray): The N x 2 positions.
+            radius (float): The maximum distance.
+
+        Returns:
+            numpy.ndarray: N booleans.
+        """
+
+        return self.clearance(pts) <= radius
+
+    def report(self, radius=3, nsample=10000, seed=0):
+        """Get the summary of the building cost and the errors against the
+        exact ray casting and collision check at random poses inside the map
+        (by the even-odd rule) and not closer than `radius` to any wall.
+
+        Args:
+            radius (float, optional): Defaults to 3. The radius of the cars.
+            nsample (int, optional): Defaults to 10000. The # of random
+                positions tried.
+            seed (int, optional): Defaults to 0. The seed of random poses.
+
+        Returns:
+            str: The summary.
+        """
+
+        rng = np.random.RandomState(seed)
+        pts = rng.uniform(self.walls.lower.min(axis=0),
+                          self.walls.upper.max(axis=0), (nsample, 2))
+        pts = pts[self.__is_inside(pts)
+                  & (self.walls.batch_min_dists(pts) > radius)]
+        radians = rng.uniform(0, 2 * math.pi, (len(pts), 1))
+        _, exact = self.walls.batch_ray_intersections(
+            pts, np.stack((np.cos(radians), np.sin(radians)), axis=2))
+        approx = self.ray_dists(pts, radians)
+        is_finite = np.isfinite(exact) & np.isfinite(approx)
+        errors = np.abs(approx - exact)[is_finite]
+        if len(errors) == 0:
+            errors = np.full(1, np.nan)
+        nmissed = np.count_nonzero(np.isfinite(exact) != np.isfinite(approx))
+
+        # the collision checks around the walls
+        near_pts = pts + rng.uniform(-radius, radius, pts.shape)
+        ncollision = np.count_nonzero(
+            self.is_near(near_pts, radius)
+            != self.walls.batch_is_near(near_pts, radius))
+        return ('Sensor field: {} x {} nodes x {} headings ({:.1f} MB), built '
+                'in {:.2f} ms; radar error mean {:.4f}, p95 {:.4f}, max {:.4f}, '
+                '{} of {} hits missed; {} of {} collision checks wrong'
+                .format(self.nx, self.ny, self.nheading,
+                        (self.dists.nbytes + self.clearances.nbytes) / 2**20,
+                        self.build_time * 1000, errors.mean(),
+                        np.percentile(errors, 95), errors.max(), nmissed,
+                        len(pts), ncollision, len(near_pts)))
+
+    def __is_inside(self, pts):
+        """Check if each point is inside the closed polyline of walls by
+        counting the walls crossed by a ray toward +x."""
+        x, y = pts[:, 0, np.newaxis], pts[:, 1, np.newaxis]
+        (x1, y1), (x2, y2) = self.walls.pt1.T, self.walls.pt2.T
+        is_crossed = (y1 > y) != (y2 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cross_x = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        return (np.count_nonzero(is_crossed & (x < cross_x), axis=1) % 2) == 1
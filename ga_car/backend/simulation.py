@@ -0,0 +1,333 @@
+"""Evaluate the chromosomes by driving the cars through the maps."""
+
+import heapq
+import math
+import multiprocessing as mp
+
+import numpy as np
+
+from .car_batch import CarBatch
+from .fitness import dataset_digest
+from .planecoord import LineSegArray2D
+from .rbfn import RBFN, decode_params
+
+
+class Track(object):
+    # the upper bound of the # of cells of the route distance grid
+    max_ncell = 2**16
+    # the steps to the 8 neighbours of a cell
+    neighbours = np.array(((1, 0), (-1, 0), (0, 1), (0, -1),
+                           (1, 1), (-1, -1), (1, -1), (-1, 1)))
+
+    def __init__(self, map_data, radius=3, cell_size=1, sensor_field=None):
+        """A map prepared for simulation. The route distance (the length of
+        the shortest path not crossing any wall) from every cell of a grid to
+        the ending area is precomputed to measure the progress of cars.
+
+        Args:
+            map_data (dict): The map read by `read_map` or `load_maps`.
+            radius (int, optional): Defaults to 3. The radius of the cars.
+            cell_size (float, optional): Defaults to 1. The width of the cells
+                of the route distance grid.
+            sensor_field (SensorField, optional): Defaults to None. The
+                precomputed field of the map for the radars and collision
+                checks of cars.
+        """
+
+        self.start_pos = tuple(map_data['start_pos'])
+        self.start_angle = map_data['start_angle']
+        self.ending_area = (tuple(map_data['end_area_lt']),
+                            tuple(map_data['end_area_rb']))
+        self.radius = radius
+        if 'walls' in map_data:
+            self.walls = map_data['walls']
+        else:
+            self.walls = LineSegArray2D(map_data['route_edge'])
+        self.sensor_field = sensor_field
+
+        (left, top), (right, bottom) = self.ending_area
+        lower = np.minimum(self.walls.lower.min(axis=0), (left, bottom))
+        upper = np.maximum(self.walls.upper.max(axis=0), (right, top))
+        width, height = upper - lower
+        self.cell_size = max(cell_size,
+                             math.sqrt(width * height / self.max_ncell))
+        self.origin = lower
+        self.nx = int(width // self.cell_size) + 1
+        self.ny = int(height // self.cell_size) + 1
+        self.route_dists = self.__get_route_dists()
+        self.start_dist = self.route_dist(np.array([self.start_pos]))[0]
+        if not math.isfinite(self.start_dist) or self.start_dist <= 0:
+            raise ValueError('The ending area is not reachable from the '
+                             'start position.')
+
+    def __cell_centers(self):
+        xs = self.origin[0] + (np.arange(self.nx) + 0.5) * self.cell_size
+        ys = self.origin[1] + (np.arange(self.ny) + 0.5) * self.cell_size
+        return np.stack(np.meshgrid(xs, ys), axis=2).reshape(-1, 2)
+
+    def __get_route_dists(self):
+        centers = self.__cell_centers()
+        # an edge to a neighbour is passable if no wall lies between the
+        # centers of the two cells
+        lengths = np.hypot(*self.neighbours.T) * self.cell_size
+        directions = self.neighbours / np.hypot(*self.neighbours.T)[:, np.newaxis]
+        _, hits = self.walls.batch_ray_intersections(
+            centers, np.broadcast_to(directions, (len(centers),) + directions.shape))
+        is_passable = hits > lengths
+
+        # Dijkstra's algorithm from the cells in the ending area
+        (left, top), (right, bottom) = self.ending_area
+        is_goal = ((left <= centers[:, 0]) & (centers[:, 0] <= right)
+                   & (bottom <= centers[:, 1]) & (centers[:, 1] <= top))
+        if not is_goal.any():
+            ix, iy = self.__cell_coords(np.array([[(left + right) / 2,
+                                                   (top + bottom) / 2]]))
+            is_goal[iy[0] * self.nx + ix[0]] = True
+        dists = np.full(len(centers), np.inf)
+        dists[is_goal] = 0
+        heap = [(0.0, int(cell)) for cell in np.flatnonzero(is_goal)]
+        steps = self.neighbours.tolist()
+        lengths = lengths.tolist()
+        while heap:
+            dist, cell = heapq.heappop(heap)
+            if dist > dists[cell]:
+                continue
+            iy, ix = divmod(cell, self.nx)
+            for k, (dx, dy) in enumerate(steps):
+                jx, jy = ix + dx, iy + dy
+                if not (0 <= jx < self.nx and 0 <= jy < self.ny
+                        and is_passable[cell, k]):
+                    continue
+                neighbour = jy * self.nx + jx
+                if dist + lengths[k] < dists[neighbour]:
+                    dists[neighbour] = dist + lengths[k]
+                    heapq.heappush(heap, (dists[neighbour], neighbour))
+        return dists.reshape(self.ny, self.nx)
+
+    def __cell_coords(self, pts):
+        coords = np.floor((pts - self.origin) / self.cell_size).astype(int)
+        return (np.clip(coords[:, 0], 0, self.nx - 1),
+                np.clip(coords[:, 1], 0, self.ny - 1))
+
+    def route_dist(self, pts):
+        """Get the route distance from each point to the ending area by the
+        nearest 2 x 2 cells of the grid.
+
+        Args:
+            pts (numpy.ndarray): The N x 2 points.
+
+        Returns:
+            numpy.ndarray: The N route distances which are infinite for the
+                points outside the route.
+        """
+
+        pts = np.asarray(pts, dtype=float).reshape(-1, 2)
+        # the cell whose center is the left-bottom one of the nearest 2 x 2
+        ix, iy = self.__cell_coords(pts - self.cell_size / 2)
+        dists = np.full(len(pts), np.inf)
+        for dx in (0, 1):
+            for dy in (0, 1):
+                jx = np.minimum(ix + dx, self.nx - 1)
+                jy = np.minimum(iy + dy, self.ny - 1)
+                centers = self.origin + (np.column_stack((jx, jy)) + 0.5) \
+                    * self.cell_size
+                np.minimum(dists, self.route_dists[jy, jx]
+                           + np.hypot(*(pts - centers).T), out=dists)
+        return dists
+
+
+def tracks_digest(tracks, *settings):
+    """Get the ID of the tracks along with the simulation settings."""
+    arrays = [np.asarray(settings, dtype=float)]
+    for track in tracks:
+        arrays += [np.array(track.start_pos + (track.start_angle,)),
+                   np.array(track.ending_area), track.walls.pt1,
+                   track.walls.pt2]
+        if track.sensor_field is not None:
+            arrays.append(np.array((track.sensor_field.cell_size,
+                                    track.sensor_field.nheading)))
+    return dataset_digest(*arrays)
+
+
+def population_sim_func(population, track, nneuron, max_steps=1000,
+                        collision_penalty=0.5, step_weight=0.1,
+                        stall_steps=50):
+    """Drive one car per chromosome through the track at once and get the
+    cost of each one, which is the sum of:
+
+    * the remaining route distance at the end over the one at the start,
+      which is 0 for the cars arrived at the ending area,
+    * `collision_penalty` if the car collided, and
+    * `step_weight` times the steps taken over `max_steps` if the car arrived,
+      or `step_weight` if it did not.
+
+    The collided cars are stopped immediately, and the cars which have not
+    got closer to the ending area by one cell in `stall_steps` steps are
+    stopped as well.
+
+    Args:
+        population (numpy.ndarray): The P x L matrix whose rows are chromosomes.
+        track (Track): The track to drive through.
+        nneuron (int): The # of neurons including the threshold one.
+        max_steps (int, optional): Defaults to 1000. The upper bound of the #
+            of steps of each car.
+        collision_penalty (float, optional): Defaults to 0.5. The cost of a
+            collision.
+        step_weight (float, optional): Defaults to 0.1. The weight of the
+            steps taken.
+        stall_steps (int, optional): Defaults to 50. The # of steps a car is
+            allowed to make no progress.
+
+    Returns:
+        numpy.ndarray: The P costs.
+    """
+
+    thresholds, weights, means, sds = decode_params(
+        np.asarray(population, dtype=float), nneuron)
+    valid = sds > 0
+    weights = np.where(valid, weights, 0)
+    coefs = np.where(valid, -0.5 / np.where(valid, sds, 1) ** 2, 0)
+    if means.shape[2] not in (3, 5):
+        raise ValueError('The length of input is not match to the one of '
+                         'trained RBFN.')
+
+    batch = CarBatch(np.tile(track.start_pos, (len(population), 1)),
+                     track.start_angle, track.radius, track.walls,
+                     track.ending_area, sensor_field=track.sensor_field)
+
+    def controller(pos, dists):
+        active = np.flatnonzero(batch.is_active)
+        # the inputs are (front, right, left) or (x, y, front, right, left)
+        inputs = dists[:, [0, 2, 1]]
+        if means.shape[2] == 5:
+            inputs = np.hstack((pos, inputs))
+        sq_dists = ((inputs[:, np.newaxis] - means[active]) ** 2).sum(axis=2)
+        outputs = thresholds[active] + (
+            weights[active] * np.exp(sq_dists * coefs[active])).sum(axis=1)
+        return RBFN.antinormalize(outputs)
+
+    best_dists = np.full(len(population), track.start_dist)
+    for step in range(1, max_steps + 1):
+        batch.step(controller)
+        if not batch.is_active.any():
+            break
+        if step % stall_steps == 0:
+            active = np.flatnonzero(batch.is_active)
+            dists = track.route_dist(batch.pos[active])
+            is_stalled = dists > best_dists[active] - track.cell_size
+            batch.is_active[active[is_stalled]] = False
+            best_dists[active] = np.minimum(best_dists[active], dists)
+
+    remaining = np.minimum(track.route_dist(batch.pos) / track.start_dist, 1)
+    remaining[batch.is_arrived] = 0
+    return (remaining + collision_penalty * batch.is_collided
+            + step_weight * np.where(batch.is_arrived,
+                                     batch.nsteps / max_steps, 1))
+
+
+class SimulationEvaluator(object):
+    def __init__(self, rbfn, tracks, max_steps=1000, collision_penalty=0.5,
+                 step_weight=0.1, stall_steps=50):
+        """Evaluate the populations by the average cost of driving through
+        the tracks in current process. See `population_sim_func` for the
+        cost.
+
+        Args:
+            rbfn (RBFN): The model template which decides the # of neurons.
+            tracks (list): The `Track`s to drive through.
+
+            Other arguments are the same as the ones of `population_sim_func`.
+        """
+
+        self.nneuron = len(rbfn.neurons)
+        self.tracks = tracks
+        self.settings = dict(max_steps=max_steps,
+                             collision_penalty=collision_penalty,
+                             step_weight=step_weight, stall_steps=stall_steps)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def evaluate(self, population):
+        """Get the average costs of the population over the tracks.
+
+        Args:
+            population (numpy.ndarray): The P x L matrix whose rows are
+                chromosomes.
+
+        Returns:
+            numpy.ndarray: The P average costs.
+        """
+
+        return np.mean([
+            population_sim_func(population, track, self.nneuron,
+                                **self.settings)
+            for track in self.tracks], axis=0)
+
+    def close(self):
+        """Release the resources held by the evaluator."""
+
+
+class PoolSimulationEvaluator(SimulationEvaluator):
+    def __init__(self, rbfn, tracks, max_steps=1000, collision_penalty=0.5,
+                 step_weight=0.1, stall_steps=50, processes=None):
+        """Evaluate the populations by driving through the tracks with a
+        long-lived pool of worker processes. The tracks are installed in
+        every worker once while the pool starts, and each evaluation is split
+        into (track, slice of population) tasks.
+
+        Args:
+            processes (int, optional): Defaults to None. The # of worker
+                processes. Use the # of CPUs if None.
+
+            Other arguments are the same as the ones of `SimulationEvaluator`.
+        """
+
+        super().__init__(rbfn, tracks, max_steps, collision_penalty,
+                         step_weight, stall_steps)
+        self.processes = processes or mp.cpu_count()
+        self.__pool = mp.Pool(self.processes, initializer=_init_sim_worker,
+                              initargs=(self.nneuron, tracks, self.settings))
+
+    def evaluate(self, population):
+        if self.__pool is None:
+            raise RuntimeError('The evaluator has been closed.')
+        population = np.asarray(population, dtype=float)
+        if len(population) == 0:
+            return np.empty(0)
+        # about two tasks per process to balance the tracks of different
+        # lengths
+        nchunk = min(len(population),
+                     max(1, -(-2 * self.processes // len(self.tracks))))
+        chunks = np.array_split(population, nchunk)
+        tasks = [(idx, chunk) for idx in range(len(self.tracks))
+                 for chunk in chunks if len(chunk) > 0]
+        costs = self.__pool.map(_evaluate_sim_in_worker, tasks, chunksize=1)
+        return np.mean(np.concatenate(costs).reshape(len(self.tracks), -1),
+                       axis=0)
+
+    def close(self):
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+            self.__pool = None
+
+
+# the tracks and settings installed in each worker process
+_sim_worker_state = {}
+
+
+def _init_sim_worker(nneuron, tracks, settings):
+    _sim_worker_state.update(nneuron=nneuron, tracks=tracks,
+                             settings=settings)
+
+
+def _evaluate_sim_in_worker(task):
+    track_idx, population = task
+    return population_sim_func(population,
+                               _sim_worker_state['tracks'][track_idx],
+                               _sim_worker_state['nneuron'],
+                               **_sim_worker_state['settings'])
@@ -0,0 +1,236 @@
+""" Define a uniform grid index over the line segments of a map. """
+
+import math
+import time
+
+import numpy as np
+
+
+class UniformGrid(object):
+    # the upper bound of the # of cells
+    max_ncell = 2**20
+
+    def __init__(self, segs, cell_size=None):
+        """A uniform grid where every cell stores the indices of the segments
+        whose bounding boxes overlap the cell, in the compressed sparse row
+        layout (`cell_items[cell_offsets[c]:cell_offsets[c + 1]]` are the
+        segments in cell `c`).
+
+        Args:
+            segs (LineSegArray2D): The line segments to index.
+            cell_size (float, optional): Defaults to None. The width of each
+                cell. Use four times the average length of segments if None.
+        """
+
+        start = time.perf_counter()
+        self.segs = segs
+        lower = np.minimum(segs.pt1, segs.pt2)
+        upper = np.maximum(segs.pt1, segs.pt2)
+        self.xmin, self.ymin = lower.min(axis=0)
+        xmax, ymax = upper.max(axis=0)
+        width, height = max(xmax - self.xmin, 1e-9), max(ymax - self.ymin, 1e-9)
+        if cell_size is None:
+            cell_size = max(np.hypot(*segs.vec.T).mean() * 4, 1e-9)
+        cell_size = max(cell_size, math.sqrt(width * height / self.max_ncell))
+        self.cell_size = cell_size
+        self.nx = int(width // cell_size) + 1
+        self.ny = int(height // cell_size) + 1
+
+        # the cells overlapped by the slightly inflated bounding box of each
+        # segment, so that the segments lying on the border of cells are
+        # stored in the cells of both sides
+        eps = 1e-9 * cell_size
+        ix0, iy0 = self.__cell_coords(lower - eps)
+        ix1, iy1 = self.__cell_coords(upper + eps)
+        widths = ix1 - ix0 + 1
+        counts = widths * (iy1 - iy0 + 1)
+        seg_ids = np.repeat(np.arange(len(segs)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                    counts)
+        cells = ((np.repeat(iy0, counts) + local // np.repeat(widths, counts))
+                 * self.nx
+                 + np.repeat(ix0, counts) + local % np.repeat(widths, counts))
+        order = np.argsort(cells, kind='stable')
+        self.cell_items = seg_ids[order]
+        self.cell_offsets = np.zeros(self.nx * self.ny + 1, dtype=int)
+        np.cumsum(np.bincount(cells, minlength=self.nx * self.ny),
+                  out=self.cell_offsets[1:])
+
+        self.build_time = time.perf_counter() - start
+        self.__reset_stats()
+
+    @classmethod
+    def from_arrays(cls, segs, params, cell_items, cell_offsets):
+        """Restore the grid built before from its parameters and cells (e.g.
+        memory mapped ones) without building it again.
+
+        Args:
+            segs (LineSegArray2D): The indexed line segments.
+            params (dict): The `xmin`, `ymin`, `cell_size`, `nx` and `ny` of
+                the grid.
+            cell_items (numpy.ndarray): The segment indices of the cells.
+            cell_offsets (numpy.ndarray): The offsets of the cells in
+                `cell_items`.
+
+        Returns:
+            UniformGrid: The grid.
+        """
+
+        grid = cls.__new__(cls)
+        grid.segs = segs
+        grid.xmin, grid.ymin = params['xmin'], params['ymin']
+        grid.cell_size = params['cell_size']
+        grid.nx, grid.ny = params['nx'], params['ny']
+        grid.cell_items = cell_items
+        grid.cell_offsets = cell_offsets
+        grid.build_time = 0
+        grid.__reset_stats()
+        return grid
+
+    def params(self):
+        """Get the parameters of the grid which `from_arrays` takes."""
+        return {'xmin': float(self.xmin), 'ymin': float(self.ymin),
+                'cell_size': float(self.cell_size), 'nx': self.nx,
+                'ny': self.ny}
+
+    def __reset_stats(self):
+        self.nqueries = 0
+        self.ntests = 0
+        self.query_time = 0
+
+    def __cell_coords(self, pts):
+        pts = np.asarray(pts, dtype=float)
+        ix = np.clip(((pts[..., 0] - self.xmin) // self.cell_size).astype(int),
+                     0, self.nx - 1)
+        iy = np.clip(((pts[..., 1] - self.ymin) // self.cell_size).astype(int),
+                     0, self.ny - 1)
+        return ix, iy
+
+    def traverse(self, origin, direction):
+        """Walk the cells crossed by a ray in order with the 2D DDA algorithm.
+
+        Args:
+            origin (tuple): The start point of the ray.
+            direction (tuple): The unit direction vector of the ray.
+
+        Yields:
+            tuple: (cell index, the ray parameter `t` where the ray leaves
+                the cell).
+        """
+
+        ox, oy = float(origin[0]), float(origin[1])
+        dx, dy = float(direction[0]), float(direction[1])
+        xmax = self.xmin + self.nx * self.cell_size
+        ymax = self.ymin + self.ny * self.cell_size
+
+        # clip the ray by the bounding box of the grid
+        t_enter, t_leave = 0, math.inf
+        for o, d, lo, hi in ((ox, dx, self.xmin, xmax),
+                             (oy, dy, self.ymin, ymax)):
+            if d == 0:
+                if not lo <= o <= hi:
+                    return
+            else:
+                ta, tb = sorted(((lo - o) / d, (hi - o) / d))
+                t_enter, t_leave = max(t_enter, ta), min(t_leave, tb)
+        if t_enter > t_leave:
+            return
+
+        ix, iy = self.__cell_coords((ox + t_enter * dx, oy + t_enter * dy))
+        ix, iy = int(ix), int(iy)
+        step_x, step_y = (1 if dx > 0 else -1), (1 if dy > 0 else -1)
+        if dx != 0:
+            t_next_x = (self.xmin + (ix + (dx > 0)) * self.cell_size - ox) / dx
+            t_delta_x = self.cell_size / abs(dx)
+        else:
+            t_next_x = t_delta_x = math.inf
+        if dy != 0:
+            t_next_y = (self.ymin + (iy + (dy > 0)) * self.cell_size - oy) / dy
+            t_delta_y = self.cell_size / abs(dy)
+        else:
+            t_next_y = t_delta_y = math.inf
+
+        while 0 <= ix < self.nx and 0 <= iy < self.ny:
+            t_exit = min(t_next_x, t_next_y, t_leave)
+            yield iy * self.nx + ix, t_exit
+            if t_exit >= t_leave:
+                return
+            if t_next_x < t_next_y:
+                ix += step_x
+                t_next_x += t_delta_x
+            else:
+                iy += step_y
+                t_next_y += t_delta_y
+
+    def ray_intersections(self, origin, directions):
+        """The same as `LineSegArray2D.ray_intersections` but only test the
+        segments in the cells crossed by each ray. The cells are visited in
+        batches of growing size until a hit inside the visited cells is
+        found.
+        """
+
+        start = time.perf_counter()
+        directions = np.asarray(directions, dtype=float)
+        intersections = np.full((len(directions), 2), np.nan)
+        dists = np.full(len(directions), np.inf)
+        for idx, direction in enumerate(directions):
+            batch, batch_size = list(), 4
+            cells = self.traverse(origin, direction)
+            for cell, t_exit in cells:
+                batch.append(self.cell_items[self.cell_offsets[cell]:
+                                             self.cell_offsets[cell + 1]])
+                if len(batch) < batch_size:
+                    continue
+                if self.__test_ray(origin, direction, batch, idx,
+                                   intersections, dists) <= t_exit:
+                    break
+                batch, batch_size = list(), batch_size * 2
+            else:
+                self.__test_ray(origin, direction, batch, idx, intersections,
+                                dists)
+        self.nqueries += len(directions)
+        self.query_time += time.perf_counter() - start
+        return intersections, dists
+
+    def __test_ray(self, origin, direction, batch, idx, intersections, dists):
+        indices = np.unique(np.concatenate(batch)) if batch else batch
+        if len(indices) > 0:
+            self.ntests += len(indices)
+            inter, dist = self.segs.ray_intersections(
+                origin, direction[np.newaxis], indices)
+            if dist[0] < dists[idx]:
+                intersections[idx], dists[idx] = inter[0], dist[0]
+        return dists[idx]
+
+    def nearby(self, center, radius):
+        """Get the indices of segments which may be closer than `radius` to
+        `center`.
+
+        Args:
+            center (tuple): The center of the query circle.
+            radius (float): The radius of the query circle.
+
+        Returns:
+            numpy.ndarray: The indices of candidate segments.
+        """
+
+        start = time.perf_counter()
+        ix0, iy0 = self.__cell_coords(np.subtract(center, radius))
+        ix1, iy1 = self.__cell_coords(np.add(center, radius))
+        indices = np.unique(np.concatenate([
+            self.cell_items[self.cell_offsets[iy * self.nx + ix0]:
+                            self.cell_offsets[iy * self.nx + ix1 + 1]]
+            for iy in range(iy0, iy1 + 1)]))
+        self.nqueries += 1
+        self.ntests += len(indices)
+        self.query_time += time.perf_counter() - start
+        return indices
+
+    def report(self):
+        """Get the summary of building and querying cost of the index."""
+        return ('Spatial index: {} walls in {} x {} cells, built in {:.2f} ms; '
+                '{} queries, {:.1f} walls tested and {:.1f} us per query'
+                .format(len(self.segs), self.nx, self.ny,
+                        self.build_time * 1000, self.nqueries,
+                        self.ntests / max(self.nqueries, 1),
+                        self.query_time * 1e6 / max(self.nqueries, 1)))
@@ -0,0 +1,79 @@
+"""Define the `Trajectory` class which records the states of a drive."""
+
+import numpy as np
+
+
+class Trajectory(object):
+    # the record of each step; the distances are in the order of radars
+    # (front, left, right)
+    dtype = np.dtype([('pos', float, (2,)), ('heading', float),
+                      ('wheel_angle', float), ('dists', float, (3,))])
+
+    def __init__(self, capacity=256, records=None):
+        """A growable preallocated structured array of the states of a car,
+        one record per step. The buffer doubles its size when it is full.
+
+        Args:
+            capacity (int, optional): Defaults to 256. The initial # of
+                records preallocated.
+            records (numpy.ndarray, optional): Defaults to None. The existing
+                records of `dtype` to wrap without copying.
+        """
+
+        if records is None:
+            self.__buffer = np.empty(max(capacity, 1), dtype=self.dtype)
+            self.__size = 0
+        else:
+            self.__buffer = records
+            self.__size = len(records)
+
+    def __len__(self):
+        return self.__size
+
+    def append(self, pos, heading, wheel_angle, dists):
+        """Record the state of one step.
+
+        Args:
+            pos (tuple): (x, y) position of the car.
+            heading (float): The angle of the car in degree.
+            wheel_angle (float): The wheel angle applied in the step.
+            dists (tuple): The distances of the front, left and right radars.
+        """
+
+        if self.__size == len(self.__buffer):
+            buffer = np.empty(len(self.__buffer) * 2, dtype=self.dtype)
+            buffer[:self.__size] = self.__buffer[:self.__size]
+            self.__buffer = buffer
+        record = self.__buffer[self.__size]
+        record['pos'] = pos
+        record['heading'] = heading
+        record['wheel_angle'] = wheel_angle
+        record['dists'] = dists
+        self.__size += 1
+
+    @property
+    def records(self):
+        """numpy.ndarray: The view (not a copy) of the recorded steps."""
+        return self.__buffer[:self.__size]
+
+    def save(self, path):
+        """Save the records as a `.npy` file."""
+        np.save(path, self.records)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Load the records saved by `save`.
+
+        Args:
+            path (str): The path of the `.npy` file.
+            mmap_mode (str, optional): Defaults to None. The memory-map mode
+                passed to `numpy.load`.
+
+        Returns:
+            Trajectory: The loaded trajectory.
+        """
+
+        records = np.load(path, mmap_mode=mmap_mode)
+        if records.dtype != cls.dtype:
+            raise ValueError('The file is not a saved trajectory.')
+        return cls(records=records)
@@ -0,0 +1,125 @@
+""" Score a trained RBFN on the datasets and maps without GUI.
+
+Usage: python -m ga_car.evaluate [options] MODEL
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from .backend.car import Car
+from .backend.dataset import load_datasets
+from .backend.drive import Drive
+from .backend.fitness import DEFAULT_BLOCK_SIZE
+from .backend.maps import load_maps
+from .backend.rbfn import RBFN
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m ga_car.evaluate',
+        description='Score a trained RBFN on the datasets and maps without '
+        'GUI.')
+    parser.add_argument('model', help='the model file of RBFN saved by '
+                        '"python -m ga_car.train --output" or the GUI')
+    parser.add_argument('--datasets', nargs='*', metavar='DATASET',
+                        help='the datasets to score the error on (all the '
+                        'datasets of the same input dimension as the model if '
+                        'no name is given)')
+    parser.add_argument('--data-dir', default='data',
+                        help='the folder of training datasets')
+    parser.add_argument('--maps', nargs='*', metavar='MAP',
+                        help='the maps to drive through (all maps if no name '
+                        'is given)')
+    parser.add_argument('--map-dir', default='maps',
+                        help='the folder of maps')
+    parser.add_argument('--max-steps', type=int, default=10000,
+                        help='the maximum # of steps of each drive')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help='the # of rows of dataset streamed at once')
+    args = parser.parse_args(argv)
+    # score on everything if nothing is chosen
+    if args.datasets is None and args.maps is None:
+        args.datasets, args.maps = [], []
+    return args
+
+
+def load_rbfn(path):
+    """Load the RBFN saved in `path` and print its metadata."""
+    try:
+        rbfn = RBFN.load(path, mmap_mode='r')
+    except (OSError, ValueError) as err:
+        raise SystemExit(str(err))
+    print('Model: {} neurons, {}D inputs; {}'.format(
+        len(rbfn.neurons) - 1, len(rbfn.neurons[1].mean),
+        ', '.join('{} {}'.format(key, value)
+                  for key, value in rbfn.metadata.items())))
+    return rbfn
+
+
+def score_datasets(rbfn, names, args):
+    datasets = load_datasets(args.data_dir)
+    data_dim = len(rbfn.neurons[1].mean)
+    if not names:
+        names = [name for name, dataset in datasets.items()
+                 if dataset.data_dim == data_dim]
+    for name in names:
+        if name not in datasets:
+            raise SystemExit('Unknown dataset "{}". Available: {}'.format(
+                name, ', '.join(datasets.keys())))
+        dataset = datasets[name]
+        if dataset.data_dim != data_dim:
+            raise SystemExit('The inputs of dataset "{}" are {}D but the ones '
+                             'of model are {}D.'.format(
+                                 name, dataset.data_dim, data_dim))
+        print('{}: error {:.7f} on {} rows'.format(
+            name, dataset_error(rbfn, dataset, args.block_size),
+            len(dataset)))
+
+
+def dataset_error(rbfn, dataset, block_size=DEFAULT_BLOCK_SIZE):
+    """Get the mean absolute error of the RBFN on the dataset, where the
+    dataset is streamed by blocks of `block_size` rows."""
+    total = 0.0
+    for start in range(0, len(dataset), block_size):
+        stop = start + block_size
+        outputs = rbfn.output_batch(dataset.inputs[start:stop], antinorm=True)
+        total += np.abs(dataset.outputs[start:stop] - outputs).sum()
+    return total / max(len(dataset), 1)
+
+
+def score_maps(rbfn, names, args):
+    data_dim = len(rbfn.neurons[1].mean)
+    if data_dim not in (3, 5):
+        raise SystemExit('The car cannot be driven by the model of {}D inputs '
+                         'but 3D or 5D ones.'.format(data_dim))
+    maps = load_maps(args.map_dir)
+    for name in names or list(maps.keys()):
+        if name not in maps:
+            raise SystemExit('Unknown map "{}". Available: {}'.format(
+                name, ', '.join(maps.keys())))
+        data = maps[name]
+        car = Car(data['start_pos'], data['start_angle'], 3, data['walls'],
+                  wall_index=data['wall_index'])
+        drive = Drive(car, rbfn, (data['end_area_lt'], data['end_area_rb']),
+                      max_steps=args.max_steps)
+        trajectory = drive.run()
+        print('{}: {} after {} steps ({:.2f} ms)'.format(
+            name, drive.status, len(trajectory), drive.elapsed * 1000))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start = time.perf_counter()
+    rbfn = load_rbfn(args.model)
+    if args.datasets is not None:
+        score_datasets(rbfn, args.datasets, args)
+    if args.maps is not None:
+        score_maps(rbfn, args.maps, args)
+    print('Scoring time: {:.3f} s'.format(time.perf_counter() - start))
+    return rbfn
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+""" Run a drive of the car in a QThread. """
+
+import math
+
+from PyQt5.QtCore import QThread, pyqtSignal, pyqtSlot
+
+
+class DriveThread(QThread):
+    sig_console = pyqtSignal(str)
+    sig_car = pyqtSignal(list, float, float)
+    sig_car_collided = pyqtSignal()
+    sig_dists = pyqtSignal(list, list, list)
+    sig_results = pyqtSignal(object)
+
+    def __init__(self, drive):
+        """Forward the callbacks of the headless drive to Qt signals.
+
+        Args:
+            drive (Drive): The drive to run in this thread.
+        """
+
+        super().__init__()
+        self.drive = drive
+        self.drive.on_console.connect(self.sig_console.emit)
+        self.drive.on_frame.connect(self.__emit_frame)
+        self.drive.on_collided.connect(self.sig_car_collided.emit)
+
+    def __emit_frame(self, pos, angle, wheel_angle, intersections, dists):
+        self.sig_car.emit(pos, angle, wheel_angle)
+        self.sig_dists.emit(
+            pos,
+            [None if math.isinf(d) else tuple(i)
+             for i, d in zip(intersections, dists)],
+            ['--' if math.isinf(d) else float(d) for d in dists])
+
+    @pyqtSlot()
+    def run(self):
+        self.sig_results.emit(self.drive.run())
+
+    @pyqtSlot()
+    def stop(self):
+        if self.isRunning():
+            self.sig_console.emit("WARNING: User interrupts running thread.")
+
+        self.drive.stop()
@@ -1,3 +1,4 @@
+from PyQt5.QtCore import QPointF
 from PyQt5.QtGui import QPainter
 from PyQt5.QtWidgets import QVBoxLayout, QFrame
 from PyQt5.QtChart import QChart, QChartView, QLineSeries
@@ -48,6 +49,14 @@ class ErrorLineChart(QFrame):
             y_max = max(self.y_pts)
         self.chart.axisY().setRange(0, y_max + y_max / 5)
 
+    def set_points(self, xs, ys, series_idx=0):
+        """Replace every point of the series at once."""
+        self.serieses[series_idx].replace(
+            [QPointF(x, y) for x, y in zip(xs, ys)])
+        self.chart.axisX().setRange(min(xs), max(xs))
+        y_max = max(ys)
+        self.chart.axisY().setRange(0, y_max + y_max / 5)
+
     def clear(self):
         self.chart.removeAllSeries()
         self.serieses = [QLineSeries() for _ in range(self.nseries)]
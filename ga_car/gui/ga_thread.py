@@ -0,0 +1,36 @@
+""" Run the genetic algorithm in a QThread. """
+
+from PyQt5.QtCore import QThread, pyqtSignal, pyqtSlot
+
+from ..backend.rbfn import RBFN
+
+
+class GAThread(QThread):
+    sig_console = pyqtSignal(str)
+    sig_current_iter_time = pyqtSignal(int)
+    sig_current_errors = pyqtSignal(object)
+    sig_iter_error = pyqtSignal(float, float)
+    sig_rbfn = pyqtSignal(RBFN)
+
+    def __init__(self, ga):
+        """Forward the callbacks of the headless genetic algorithm to Qt
+        signals.
+
+        Args:
+            ga (GA): The genetic algorithm to run in this thread.
+        """
+
+        super().__init__()
+        self.ga = ga
+        self.ga.on_console.connect(self.sig_console.emit)
+        self.ga.on_current_iter_time.connect(self.sig_current_iter_time.emit)
+        self.ga.on_current_errors.connect(self.sig_current_errors.emit)
+        self.ga.on_iter_error.connect(self.sig_iter_error.emit)
+        self.ga.on_rbfn.connect(self.sig_rbfn.emit)
+
+    def run(self):
+        self.ga.run()
+
+    @pyqtSlot()
+    def stop(self):
+        self.ga.stop()
@@ -2,12 +2,14 @@
 
 from PyQt5.QtCore import Qt, pyqtSlot
 from PyQt5.QtWidgets import (QHBoxLayout, QFormLayout, QGroupBox, QComboBox,
-                             QPushButton, QLabel, QTextEdit, QSpinBox)
+                             QPushButton, QLabel, QTextEdit, QSpinBox,
+                             QCheckBox, QFileDialog)
 
 from .panel import Panel
 from .car_simulator_plot import CarSimulatorPlot
+from .drive_thread import DriveThread
 from ..backend.car import Car
-from ..backend.run import RunCar
+from ..backend.drive import Drive
 from ..backend.rbfn import RBFN
 
 
@@ -17,6 +19,10 @@ class TestingPanel(Panel):
         super().__init__()
         self.maps = maps
         self.rbfn = None
+        # the trajectory of last running
+        self.trajectory = None
+        # the spatial indexes of walls built once for each map
+        self.__wall_indexes = dict()
 
         self.__set_execution_ui()
         self.__set_outputs_ui()
@@ -42,6 +48,23 @@ class TestingPanel(Panel):
         self.stop_btn.setStatusTip('Force the testing stop running.')
         self.stop_btn.setDisabled(True)
 
+        self.save_btn = QPushButton('Save Path')
+        self.save_btn.setStatusTip('Save the trajectory of last testing as a '
+                                   '.npy file.')
+        self.save_btn.setDisabled(True)
+        self.save_btn.clicked.connect(self.__save_trajectory)
+
+        self.load_model_btn = QPushButton('Load Model')
+        self.load_model_btn.setStatusTip('Load a trained RBFN model file for '
+                                         'testing without training.')
+        self.load_model_btn.clicked.connect(self.__load_model)
+
+        self.save_model_btn = QPushButton('Save Model')
+        self.save_model_btn.setStatusTip('Save current RBFN model as a file. '
+                                         '(available after training)')
+        self.save_model_btn.setDisabled(True)
+        self.save_model_btn.clicked.connect(self.__save_model)
+
         self.fps = QSpinBox()
         self.fps.setMinimum(1)
         self.fps.setMaximum(60)
@@ -49,11 +72,19 @@ class TestingPanel(Panel):
         self.fps.setStatusTip("The re-drawing rate for car simulator. High fps "
                               "may cause the plot shows discontinuously.")
 
+        self.max_speed_cb = QCheckBox('Max Speed')
+        self.max_speed_cb.setStatusTip("Drive the car as fast as possible and "
+                                       "only re-draw the plot at the fps.")
+
         inner_layout.addWidget(self.map_selector, 1)
         inner_layout.addWidget(QLabel("FPS:"))
         inner_layout.addWidget(self.fps)
+        inner_layout.addWidget(self.max_speed_cb)
         inner_layout.addWidget(self.start_btn)
         inner_layout.addWidget(self.stop_btn)
+        inner_layout.addWidget(self.save_btn)
+        inner_layout.addWidget(self.load_model_btn)
+        inner_layout.addWidget(self.save_model_btn)
 
         self._layout.addWidget(group_box)
 
@@ -102,14 +133,21 @@ class TestingPanel(Panel):
     def __init_widgets(self):
         self.start_btn.setDisabled(True)
         self.stop_btn.setEnabled(True)
+        self.save_btn.setDisabled(True)
+        self.load_model_btn.setDisabled(True)
+        self.save_model_btn.setDisabled(True)
         self.fps.setDisabled(True)
+        self.max_speed_cb.setDisabled(True)
         self.map_selector.setDisabled(True)
 
     @pyqtSlot()
     def __reset_widgets(self):
         self.start_btn.setEnabled(True)
         self.stop_btn.setDisabled(True)
+        self.load_model_btn.setEnabled(True)
+        self.save_model_btn.setEnabled(True)
         self.fps.setEnabled(True)
+        self.max_speed_cb.setEnabled(True)
         self.map_selector.setEnabled(True)
 
     @pyqtSlot(str)
@@ -132,10 +170,17 @@ class TestingPanel(Panel):
 
     @pyqtSlot()
     def __change_map(self):
-        self.__current_map = self.maps[self.map_selector.currentText()]
+        map_name = self.map_selector.currentText()
+        self.__current_map = self.maps[map_name]
+        if map_name not in self.__wall_indexes:
+            self.__wall_indexes[map_name] = self.__current_map.get(
+                'wall_index')
         self.__car = Car(self.__current_map['start_pos'],
-                         self.__current_map['start_angle'],
-                         3, self.__current_map['route_edge'])
+                         self.__current_map['start_angle'], 3,
+                         self.__current_map.get(
+                             'walls', self.__current_map['route_edge']),
+                         wall_index=self.__wall_indexes[map_name])
+        self.__wall_indexes[map_name] = self.__car.wall_index
         self.simulator.paint_map(self.__current_map)
         self.__move_car(self.__current_map['start_pos'],
                         self.__current_map['start_angle'])
@@ -154,6 +199,33 @@ class TestingPanel(Panel):
         self.rbfn = rbfn
         self.print_console('New RBFN model has been loaded.')
         self.start_btn.setEnabled(True)
+        self.save_model_btn.setEnabled(True)
+
+    @pyqtSlot()
+    def __load_model(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, 'Load Model', '', 'RBFN Models (*.rbfn);;All Files (*)')
+        if not path:
+            return
+        try:
+            rbfn = RBFN.load(path)
+        except (OSError, ValueError) as err:
+            self.print_console('ERROR: {}'.format(err))
+            return
+        self.load_rbfn(rbfn)
+        self.print_console('The model of {} neurons and {}D inputs has been '
+                           'loaded from {}. {}'.format(
+                               len(rbfn.neurons) - 1,
+                               len(rbfn.neurons[1].mean), path,
+                               rbfn.metadata))
+
+    @pyqtSlot()
+    def __save_model(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, 'Save Model', 'model.rbfn', 'RBFN Models (*.rbfn)')
+        if path:
+            self.rbfn.save(path)
+            self.print_console('The model has been saved to {}.'.format(path))
 
     @pyqtSlot()
     def __run(self):
@@ -162,10 +234,13 @@ class TestingPanel(Panel):
         # create a QThread
         if self.rbfn is None:
             raise TypeError('The RBFN model has not yet loaded.')
-        self.__thread = RunCar(self.__car, self.rbfn,
-                               (self.__current_map['end_area_lt'],
-                                self.__current_map['end_area_rb']),
-                               self.fps.value())
+        fps = self.fps.value()
+        drive = Drive(self.__car, self.rbfn,
+                      (self.__current_map['end_area_lt'],
+                       self.__current_map['end_area_rb']),
+                      fps=None if self.max_speed_cb.isChecked() else fps,
+                      frame_interval=1 / fps)
+        self.__thread = DriveThread(drive)
         self.stop_btn.clicked.connect(self.__thread.stop)
         self.__thread.started.connect(self.__init_widgets)
         self.__thread.finished.connect(self.__reset_widgets)
@@ -176,7 +251,19 @@ class TestingPanel(Panel):
         self.__thread.sig_results.connect(self.__get_results)
         self.__thread.start()
 
-    @pyqtSlot(list)
-    def __get_results(self, results):
-        """Get the results of last running and draw the path of it."""
-        self.simulator.paint_path([d['x'] for d in results], [d['y'] for d in results])
+    @pyqtSlot(object)
+    def __get_results(self, trajectory):
+        """Get the trajectory of last running and draw the path of it."""
+        self.trajectory = trajectory
+        self.save_btn.setEnabled(len(trajectory) > 0)
+        pos = trajectory.records['pos']
+        self.simulator.paint_path(pos[:, 0], pos[:, 1])
+
+    @pyqtSlot()
+    def __save_trajectory(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, 'Save Trajectory', 'trajectory.npy', 'NumPy Files (*.npy)')
+        if path:
+            self.trajectory.save(path)
+            self.print_console('The trajectory has been saved to {}.'.format(
+                path))
@@ -1,5 +1,6 @@
 """ Define the contents of training panel. """
 
+import numpy as np
 from PyQt5.QtCore import Qt, pyqtSlot
 from PyQt5.QtWidgets import (QVBoxLayout, QHBoxLayout, QFormLayout, QGroupBox,
                              QComboBox, QSpinBox, QDoubleSpinBox, QLabel,
@@ -9,8 +10,10 @@ from PyQt5.QtWidgets import (QVBoxLayout, QHBoxLayout, QFormLayout, QGroupBox,
 from .panel import Panel
 from .testing_panel import TestingPanel
 from .error_linechart import ErrorLineChart
+from .ga_thread import GAThread
 from ..backend.rbfn import RBFN
 from ..backend.ga import GA
+from ..backend.simulation import Track
 
 
 class TrainingPanel(Panel):
@@ -23,6 +26,8 @@ class TrainingPanel(Panel):
             raise TypeError('"testing_panel" must be the instance of '
                             '"TestingPanel"')
         self.datasets = datasets
+        # the tracks for simulation fitness built once for all maps
+        self.__tracks = None
 
         self.__set_execution_ui()
         self.__set_options_ui()
@@ -51,10 +56,18 @@ class TrainingPanel(Panel):
                                        'fitting for populations.')
         self.multicore_cb.setChecked(True)
 
+        self.shared_memory_cb = QCheckBox('Shared Memory')
+        self.shared_memory_cb.setStatusTip('Share the population and dataset '
+                                           'with the processes through shared '
+                                           'memory instead of pickling them '
+                                           '(only for multicore).')
+        self.multicore_cb.toggled.connect(self.shared_memory_cb.setEnabled)
+
         inner_layout.addWidget(self.data_selector, 1)
         inner_layout.addWidget(self.start_btn)
         inner_layout.addWidget(self.stop_btn)
         inner_layout.addWidget(self.multicore_cb)
+        inner_layout.addWidget(self.shared_memory_cb)
 
         self._layout.addWidget(group_box)
 
@@ -81,6 +94,16 @@ class TrainingPanel(Panel):
         self.reproduction.addWidget(self.tournament_selection)
         self.roulette_wheel_selection.toggle()
 
+        self.tournament_size = QSpinBox()
+        self.tournament_size.setRange(2, 100)
+        self.tournament_size.setValue(2)
+        self.tournament_size.setStatusTip('The # of contestants in each '
+                                          'tournament (only for tournament '
+                                          'selection).')
+        self.tournament_size.setDisabled(True)
+        self.tournament_selection.toggled.connect(
+            self.tournament_size.setEnabled)
+
         self.score_amplifier = QDoubleSpinBox()
         self.score_amplifier.setRange(1, 3)
         self.score_amplifier.setValue(1.7)
@@ -88,6 +111,12 @@ class TrainingPanel(Panel):
         self.score_amplifier.setStatusTip('Amplify the winner score in '
                                           'selection (exponentially).')
 
+        self.elitism = QSpinBox()
+        self.elitism.setRange(0, 100000000)
+        self.elitism.setValue(0)
+        self.elitism.setStatusTip('The # of best chromosomes copied to the '
+                                  'next iteration untouched.')
+
         self.p_crossover = QDoubleSpinBox()
         self.p_crossover.setRange(0, 1)
         self.p_crossover.setValue(0.5)
@@ -125,15 +154,24 @@ class TrainingPanel(Panel):
         self.sd_max.setStatusTip('The maximum of standard deviation of each '
                                  'neuron in RBFN (only for initialization).')
 
+        self.fitness_selector = QComboBox()
+        self.fitness_selector.addItems(('Dataset Error', 'Drive on All Maps'))
+        self.fitness_selector.setStatusTip('Score the chromosomes by the error '
+                                           'on the training dataset or by '
+                                           'driving through all maps.')
+
         inner_layout.addRow('Iterating Times:', self.iter_times)
         inner_layout.addRow('Population Size:', self.population_size)
         inner_layout.addRow('Reproduction:', self.reproduction)
+        inner_layout.addRow('Tournament Size:', self.tournament_size)
         inner_layout.addRow('Score Amplifier:', self.score_amplifier)
+        inner_layout.addRow('Elitism:', self.elitism)
         inner_layout.addRow('Crossover Probability:', self.p_crossover)
         inner_layout.addRow('Mutation Probability:', self.p_mutation)
         inner_layout.addRow('Mutation Scale:', self.mutation_scale)
         inner_layout.addRow('Number of Neuron:', self.nneuron)
         inner_layout.addRow('Maximum of SD:', self.sd_max)
+        inner_layout.addRow('Fitness:', self.fitness_selector)
 
         self._layout.addWidget(group_box)
 
@@ -155,15 +193,16 @@ class TrainingPanel(Panel):
 
         self.current_iter_time.setStatusTip('The current iterating time of '
                                             'genetic algorithm.')
-        self.current_error.setStatusTip('The current error from the fitting '
-                                        'function.')
+        self.current_error.setStatusTip('The minimum / median / 90th '
+                                        'percentile of errors from the fitting '
+                                        'function in current iteration.')
         self.avg_error.setStatusTip('The average error from the fitting '
                                     'function in current iteration.')
         self.least_error.setStatusTip('The least error from the fitting '
                                       'function in training.')
 
         inner_layout.addRow('Current Iterating Time:', self.current_iter_time)
-        inner_layout.addRow('Current Error:', self.current_error)
+        inner_layout.addRow('Current Errors:', self.current_error)
         inner_layout.addRow('Average Error:', self.avg_error)
         inner_layout.addRow('Least Error:', self.least_error)
         inner_layout.addRow(self.progressbar)
@@ -176,9 +215,9 @@ class TrainingPanel(Panel):
         group_box.setLayout(inner_layout)
 
         self.err_chart = ErrorLineChart(1)
-        self.err_chart.setStatusTip('The history of error from the fitting '
-                                    'of genetic algorithm for each data.')
-        self.__err_x = 1
+        self.err_chart.setStatusTip('The percentiles (x-axis) of error from '
+                                    'the fitting of genetic algorithm in the '
+                                    'latest reported iteration.')
 
         self.iter_err_chart = ErrorLineChart(2, ('Avg', 'Least'))
         self.iter_err_chart.setStatusTip('The history of average and least '
@@ -186,7 +225,7 @@ class TrainingPanel(Panel):
                                          'algorithm for each iteration.')
         self.iter_err_chart.setMinimumHeight(150)
 
-        inner_layout.addWidget(QLabel('Current Error'))
+        inner_layout.addWidget(QLabel('Current Error Percentiles'))
         inner_layout.addWidget(self.err_chart)
         inner_layout.addWidget(QLabel('Average Error'))
         inner_layout.addWidget(self.iter_err_chart)
@@ -197,48 +236,57 @@ class TrainingPanel(Panel):
         self.start_btn.setDisabled(True)
         self.stop_btn.setEnabled(True)
         self.multicore_cb.setDisabled(True)
+        self.shared_memory_cb.setDisabled(True)
         self.data_selector.setDisabled(True)
         self.iter_times.setDisabled(True)
         self.population_size.setDisabled(True)
         self.score_amplifier.setDisabled(True)
         self.roulette_wheel_selection.setDisabled(True)
         self.tournament_selection.setDisabled(True)
+        self.tournament_size.setDisabled(True)
+        self.elitism.setDisabled(True)
         self.p_crossover.setDisabled(True)
         self.p_mutation.setDisabled(True)
         self.mutation_scale.setDisabled(True)
         self.nneuron.setDisabled(True)
         self.sd_max.setDisabled(True)
+        self.fitness_selector.setDisabled(True)
         self.err_chart.clear()
         self.iter_err_chart.clear()
-        self.__err_x = 1
 
     @pyqtSlot()
     def __reset_widgets(self):
         self.start_btn.setEnabled(True)
         self.stop_btn.setDisabled(True)
         self.multicore_cb.setEnabled(True)
+        self.shared_memory_cb.setEnabled(self.multicore_cb.isChecked())
         self.data_selector.setEnabled(True)
         self.iter_times.setEnabled(True)
         self.population_size.setEnabled(True)
         self.score_amplifier.setEnabled(True)
         self.roulette_wheel_selection.setEnabled(True)
         self.tournament_selection.setEnabled(True)
+        self.tournament_size.setEnabled(self.tournament_selection.isChecked())
+        self.elitism.setEnabled(True)
         self.p_crossover.setEnabled(True)
         self.p_mutation.setEnabled(True)
         self.mutation_scale.setEnabled(True)
         self.nneuron.setEnabled(True)
         self.sd_max.setEnabled(True)
+        self.fitness_selector.setEnabled(True)
 
     @pyqtSlot(int)
     def __show_current_iter_time(self, value):
         self.current_iter_time.setText(str(value + 1))
         self.progressbar.setValue(value + 1)
 
-    @pyqtSlot(float)
-    def __show_current_error(self, value):
-        self.current_error.setText('{:.7f}'.format(value))
-        self.err_chart.append_point(self.__err_x, value)
-        self.__err_x += 1
+    @pyqtSlot(object)
+    def __show_current_errors(self, errors):
+        percentiles = np.arange(0, 101, 5)
+        values = np.percentile(errors, percentiles)
+        self.current_error.setText('{:.4f} / {:.4f} / {:.4f}'.format(
+            values[0], values[10], values[18]))
+        self.err_chart.set_points(percentiles, values)
 
     @pyqtSlot(float, float)
     def __show_iter_error(self, avg, least):
@@ -254,28 +302,53 @@ class TrainingPanel(Panel):
 
         self.__current_dataset = self.datasets[self.data_selector.currentText(
         )]
-        mean_range = (min(min(d.i) for d in self.__current_dataset),
-                      max(max(d.i) for d in self.__current_dataset))
+        mean_range = self.__current_dataset.mean_range
         if self.roulette_wheel_selection.isChecked():
             reproduction_method = 'rw'
         else:
             reproduction_method = 't'
 
+        tracks = None
+        if self.fitness_selector.currentIndex() == 1:
+            if self.__tracks is None:
+                self.__tracks = self.__build_tracks()
+            if not self.__tracks:
+                self.testing_panel.print_console(
+                    'ERROR: No map can be driven through for training.')
+                return
+            tracks = self.__tracks
+
         rbfn = RBFN(self.nneuron.value(), mean_range, self.sd_max.value())
 
-        self.__ga = GA(self.iter_times.value(), self.population_size.value(),
-                       reproduction_method,
-                       self.p_crossover.value(), self.p_mutation.value(),
-                       self.mutation_scale.value(), rbfn,
-                       self.__current_dataset, mean_range, self.sd_max.value(),
-                       score_amplifier=self.score_amplifier.value(),
-                       is_multicore=self.multicore_cb.isChecked())
+        ga = GA(self.iter_times.value(), self.population_size.value(),
+                reproduction_method,
+                self.p_crossover.value(), self.p_mutation.value(),
+                self.mutation_scale.value(), rbfn,
+                self.__current_dataset, mean_range, self.sd_max.value(),
+                score_amplifier=self.score_amplifier.value(),
+                is_multicore=self.multicore_cb.isChecked(),
+                is_shared_memory=self.shared_memory_cb.isChecked(),
+                tournament_size=self.tournament_size.value(),
+                elitism=self.elitism.value(), tracks=tracks)
+        self.__ga = GAThread(ga)
         self.stop_btn.clicked.connect(self.__ga.stop)
         self.__ga.started.connect(self.__init_widgets)
         self.__ga.finished.connect(self.__reset_widgets)
         self.__ga.sig_current_iter_time.connect(self.__show_current_iter_time)
-        self.__ga.sig_current_error.connect(self.__show_current_error)
+        self.__ga.sig_current_errors.connect(self.__show_current_errors)
         self.__ga.sig_iter_error.connect(self.__show_iter_error)
         self.__ga.sig_console.connect(self.testing_panel.print_console)
         self.__ga.sig_rbfn.connect(self.testing_panel.load_rbfn)
         self.__ga.start()
+
+    def __build_tracks(self):
+        """Prepare every loaded map for simulation, skipping the ones whose
+        ending area is not reachable."""
+        tracks = []
+        for name, map_data in self.testing_panel.maps.items():
+            try:
+                tracks.append(Track(map_data))
+            except ValueError as err:
+                self.testing_panel.print_console(
+                    'WARNING: Map "{}" is skipped. {}'.format(name, err))
+        return tracks
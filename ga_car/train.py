@@ -0,0 +1,166 @@
+""" Train the RBFN with the genetic algorithm without GUI.
+
+Usage: python -m ga_car.train [options] DATASET
+"""
+
+import argparse
+import time
+
+from .backend.dataset import load_datasets
+from .backend.fitness import DEFAULT_BLOCK_SIZE
+from .backend.ga import GA
+from .backend.maps import load_maps
+from .backend.rbfn import RBFN
+from .backend.sensor_field import SensorField
+from .backend.simulation import Track
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m ga_car.train',
+        description='Train the RBFN with the genetic algorithm without GUI.')
+    parser.add_argument('dataset', help='the name of training dataset in the '
+                        'data folder, e.g. train4dAll')
+    parser.add_argument('--data-dir', default='data',
+                        help='the folder of training datasets')
+    parser.add_argument('--iter-times', type=int, default=300,
+                        help='the total iterating times for training')
+    parser.add_argument('--population-size', type=int, default=100,
+                        help='the population size for genetic algorithm')
+    parser.add_argument('--reproduction', choices=('rw', 't'), default='rw',
+                        help='roulette wheel (rw) or tournament (t) '
+                        'selection')
+    parser.add_argument('--tournament-size', type=int, default=2,
+                        help='the # of contestants in each tournament')
+    parser.add_argument('--score-amplifier', type=float, default=1.7,
+                        help='amplify the winner score in selection')
+    parser.add_argument('--elitism', type=int, default=0,
+                        help='the # of best chromosomes copied to the next '
+                        'iteration untouched')
+    parser.add_argument('--pc', type=float, default=0.5,
+                        help='the probability of crossover')
+    parser.add_argument('--pm', type=float, default=0.5,
+                        help='the probability of mutation')
+    parser.add_argument('--mutation-scale', type=float, default=0.1,
+                        help='the scale of random noise in mutation')
+    parser.add_argument('--nneuron', type=int, default=6,
+                        help='the number of RBFN neuron')
+    parser.add_argument('--sd-max', type=float, default=10,
+                        help='the maximum of standard deviation of each '
+                        'neuron (only for initialization)')
+    parser.add_argument('--singlecore', action='store_true',
+                        help='do not use multiprocessing')
+    parser.add_argument('--shared-memory', action='store_true',
+                        help='share data with processes through shared '
+                        'memory')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help='the # of rows of dataset streamed at once in '
+                        'fitness evaluation')
+    parser.add_argument('--batch-size', type=int,
+                        help='score the population on random mini-batches '
+                        'of this many rows instead of the whole dataset')
+    parser.add_argument('--batch-growth', type=float, default=1.05,
+                        help='the growth rate of the mini-batch size per '
+                        'iteration')
+    parser.add_argument('--full-eval-interval', type=int, default=10,
+                        help='score the best chromosomes on the whole dataset '
+                        'every this many iterations in mini-batch training')
+    parser.add_argument('--seed', type=int,
+                        help='the seed of the mini-batch sampler')
+    parser.add_argument('--cache-size', type=int, default=4096,
+                        help='the maximum # of cached fitting results (0 '
+                        'disables the cache)')
+    parser.add_argument('--tracks', nargs='*', metavar='MAP',
+                        help='score the chromosomes by driving through the '
+                        'maps (all maps if no name is given) instead of the '
+                        'error on the dataset')
+    parser.add_argument('--map-dir', default='maps',
+                        help='the folder of maps')
+    parser.add_argument('--max-steps', type=int, default=1000,
+                        help='the maximum # of steps of each drive in '
+                        'simulation')
+    parser.add_argument('--sensor-field', action='store_true',
+                        help='look up the radars and collisions from a '
+                        'precomputed field of each map in simulation')
+    parser.add_argument('--sensor-cell-size', type=float, default=1,
+                        help='the spacing of nodes of the sensor field')
+    parser.add_argument('--sensor-headings', type=int, default=72,
+                        help='the # of headings at each node of the sensor '
+                        'field')
+    parser.add_argument('--output', metavar='PATH',
+                        help='save the trained RBFN as a model file which '
+                        'can be loaded by "python -m ga_car.evaluate" and the '
+                        'GUI')
+    parser.add_argument('--quiet', action='store_true',
+                        help='do not print the error of each iteration')
+    args = parser.parse_args(argv)
+    if args.batch_size is not None and args.batch_size < 1:
+        parser.error('--batch-size must be at least 1')
+    if args.batch_growth < 1:
+        parser.error('--batch-growth must be at least 1')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    datasets = load_datasets(args.data_dir)
+    if args.dataset not in datasets:
+        raise SystemExit('Unknown dataset "{}". Available: {}'.format(
+            args.dataset, ', '.join(datasets.keys())))
+    dataset = datasets[args.dataset]
+    mean_range = dataset.mean_range
+
+    tracks = None
+    if args.tracks is not None:
+        maps = load_maps(args.map_dir)
+        names = args.tracks or list(maps.keys())
+        unknown = [name for name in names if name not in maps]
+        if unknown:
+            raise SystemExit('Unknown map "{}". Available: {}'.format(
+                unknown[0], ', '.join(maps.keys())))
+        tracks = list()
+        for name in names:
+            field = None
+            if args.sensor_field:
+                field = SensorField(maps[name]['walls'],
+                                    args.sensor_cell_size, args.sensor_headings)
+                print('{}: {}'.format(name, field.report()))
+            tracks.append(Track(maps[name], sensor_field=field))
+
+    rbfn = RBFN(args.nneuron, mean_range, args.sd_max)
+    ga = GA(args.iter_times, args.population_size, args.reproduction,
+            args.pc, args.pm, args.mutation_scale, rbfn, dataset, mean_range,
+            args.sd_max, score_amplifier=args.score_amplifier,
+            is_multicore=not args.singlecore,
+            is_shared_memory=args.shared_memory,
+            tournament_size=args.tournament_size,
+            cache_size=args.cache_size, elitism=args.elitism, tracks=tracks,
+            max_steps=args.max_steps, block_size=args.block_size,
+            batch_size=args.batch_size, batch_growth=args.batch_growth,
+            full_eval_interval=args.full_eval_interval, seed=args.seed)
+
+    progress = {'iter_time': 0}
+
+    def show_current_iter_time(value):
+        progress['iter_time'] = value + 1
+
+    def show_iter_error(avg, least):
+        print('Iteration {}: average error {:.7f}, least error {:.7f}'.format(
+            progress['iter_time'], avg, least))
+
+    ga.on_console.connect(print)
+    ga.on_current_iter_time.connect(show_current_iter_time)
+    if not args.quiet:
+        ga.on_iter_error.connect(show_iter_error)
+
+    start = time.perf_counter()
+    ga.run()
+    print('Training time: {:.3f} s'.format(time.perf_counter() - start))
+    if args.output is not None and not ga.abort:
+        rbfn.save(args.output)
+        print('The model has been saved to "{}".'.format(args.output))
+    return rbfn
+
+
+if __name__ == '__main__':
+    main()
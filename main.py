@@ -8,58 +8,29 @@ This file is the entry point of whole project.
 GitLab: https://gitlab.com/GLaDOS1105/ga-car
 """
 
-import collections
 import multiprocessing
-import pathlib
 import sys
 
-from PyQt5.QtWidgets import QApplication
+from ga_car.backend.dataset import load_datasets
+from ga_car.backend.maps import load_maps
 
-import ga_car.gui.base
-from ga_car.backend.ga import TrainingData
 
 def main():
     """ Create GUI application and read files. """
+    # the GUI (PyQt5, QtChart and matplotlib) is imported only when the
+    # window is created, so the worker processes spawned from this module and
+    # the headless jobs do not pay for it
+    from PyQt5.QtWidgets import QApplication
+
+    import ga_car.gui.base
+
     sys.argv += ['--style', 'fusion']
     app = QApplication(sys.argv)
-    window = ga_car.gui.base.GUIBase(read_maps(), read_training_datasets())
+    window = ga_car.gui.base.GUIBase(load_maps(), load_datasets())
     window.show()
     sys.exit(app.exec_())
 
 
-def read_maps(folderpath='maps'):
-    """ Read every data of maps in `folderpath` folder. Return the
-    dictionary containing dataset.
-    """
-    maps = {}
-    folderpath = pathlib.Path(folderpath)
-    for filepath in folderpath.glob("*.txt"):
-        with filepath.open() as casefile:
-            contents = [tuple(map(float, line.split(',')))
-                        for line in casefile]
-        maps[filepath.stem] = {
-            "start_pos": (contents[0][0], contents[0][1]),
-            "start_angle": contents[0][2],
-            "end_area_lt": contents[1],  # ending area - left-top
-            "end_area_rb": contents[2],  # ending area - right-bottom
-            "route_edge": contents[3:]
-        }
-    return collections.OrderedDict(sorted(maps.items()))
-
-
-def read_training_datasets(folderpath='data'):
-    dataset = {}
-    folderpath = pathlib.Path(folderpath)
-    for filepath in folderpath.glob("*.txt"):
-        with filepath.open() as datafile:
-            contents = list()
-            for line in datafile:
-                raw = tuple(map(float, line.split()))
-                contents.append(TrainingData(raw[:-1], raw[-1]))
-        dataset[filepath.stem] = contents
-    return collections.OrderedDict(sorted(dataset.items()))
-
-
 if __name__ == '__main__':
     multiprocessing.freeze_support()
     main()